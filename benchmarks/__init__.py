@@ -0,0 +1,8 @@
+""" Benchmarks for the Amotion Atrea integration """
+
+import os
+import sys
+
+# The benchmarks drive the standalone client, not Home Assistant
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                "custom_components", "amotionatrea"))
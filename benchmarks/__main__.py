@@ -0,0 +1,244 @@
+""" End-to-end benchmark of the integration against the simulated unit
+
+Run from the repository root:
+
+    python -m benchmarks --latency 0.005 --jitter 0.005 --iterations 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from pyamotion import AtreaClient
+from pyamotion.const import CONTROL_DELAY
+
+from .simulator import AtreaSimulator
+
+
+def percentiles(samples):
+    """Summarize latency samples in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+async def wait_for(predicate, timeout):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.001)
+
+
+async def bench_setup(simulator, collect_metrics=False, record=None, rate_limit=0):
+    start = time.perf_counter()
+    atrea = AtreaClient(
+        simulator.url,
+        simulator.username,
+        simulator.password,
+        collect_metrics=collect_metrics,
+        rate_limit=rate_limit,
+    )
+    if record:
+        atrea.start_recording(record)
+    await wait_for(lambda: atrea.logged_in and atrea.sw_version, timeout=60)
+    return atrea, time.perf_counter() - start
+
+
+async def timed(step, iterations, pause=0.0):
+    """Run `step(i)` repeatedly, `pause` seconds apart, return latency
+    samples and the error count."""
+    samples = []
+    errors = 0
+    for i in range(iterations):
+        if pause:
+            await asyncio.sleep(pause)
+        start = time.perf_counter()
+        try:
+            await step(i)
+        except Exception:  # pylint: disable=broad-except
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - start)
+    return {**percentiles(samples), 'errors': errors}
+
+
+async def bench_refresh(atrea, iterations):
+    async def step(_):
+        # Force the live refresh to ask for ui_info
+        atrea.status = atrea.status.update(current_temperature=None)
+        await atrea.fetch()
+    return await timed(step, iterations)
+
+
+async def bench_slow_tiers(atrea, iterations):
+    async def step(_):
+        await asyncio.gather(atrea.fetch_diagram(), atrea.fetch_maintenance())
+    return await timed(step, iterations)
+
+
+async def bench_command(atrea, iterations):
+    """Single commands, spaced so that none joins the burst of the previous."""
+    async def step(i):
+        await atrea.set_temperature(18 + i % 6)
+    return await timed(step, iterations, CONTROL_DELAY)
+
+
+async def bench_control_burst(atrea, simulator, iterations, taps=10, spacing=0.05):
+    """Taps on the temperature buttons `spacing` seconds apart, timed from the
+    first tap until every tap returned, and the control writes they caused."""
+    async def tap(i, delay):
+        await asyncio.sleep(delay)
+        await atrea.set_temperature(18 + i % 6)
+
+    async def step(_):
+        await asyncio.gather(*(tap(i, i * spacing) for i in range(taps)))
+
+    controls = simulator.controls
+    report = await timed(step, iterations)
+    report['controls_per_burst'] = (simulator.controls - controls) / iterations
+    return report
+
+
+async def bench_command_under_load(atrea, iterations, pollers=8):
+    """Commands while `pollers` tasks keep the slow tiers busy."""
+    async def poll():
+        while True:
+            try:
+                await atrea.fetch_maintenance()
+                await atrea.fetch_diagram()
+            except Exception:  # dropped duplicate polls
+                await asyncio.sleep(0.01)
+
+    load = [asyncio.create_task(poll()) for _ in range(pollers)]
+    await asyncio.sleep(0.1)
+
+    async def step(i):
+        await atrea.set_temperature(18 + i % 6)
+
+    try:
+        return await timed(step, iterations, CONTROL_DELAY)
+    finally:
+        for task in load:
+            task.cancel()
+        await asyncio.gather(*load, return_exceptions=True)
+
+
+async def bench_reconnect(atrea, simulator, iterations):
+    """Time from a forced disconnect until the unit is logged in again."""
+    async def step(_):
+        await simulator.disconnect_all()
+        await wait_for(lambda: not atrea.logged_in, timeout=10)
+        await wait_for(lambda: atrea.logged_in, timeout=60)
+    return await timed(step, iterations)
+
+
+async def bench_receive(atrea, simulator, count):
+    """Feed ui_info events straight into receive(), measuring messages/sec."""
+    event = simulator._ui_info_event()
+    start = time.perf_counter()
+    for _ in range(count):
+        await atrea.receive(event)
+    return count / (time.perf_counter() - start)
+
+
+async def run(args):
+    simulator = AtreaSimulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        drop_rate=args.drop_rate,
+        disconnect_after=args.disconnect_after,
+        push_rate=args.push_rate,
+        slow_latency=args.slow_latency,
+        serial=args.serial,
+        seed=args.seed,
+    )
+    async with simulator:
+        atrea, setup_time = await bench_setup(
+            simulator, args.metrics, args.record, args.rate_limit
+        )
+        report = {
+            'setup_ms': setup_time * 1000,
+            'refresh': await bench_refresh(atrea, args.iterations),
+            'slow_tiers': await bench_slow_tiers(atrea, args.iterations),
+            'command': await bench_command(atrea, args.iterations),
+            'control_burst': await bench_control_burst(atrea, simulator, min(args.iterations, 5)),
+            'command_under_load': await bench_command_under_load(atrea, args.iterations),
+            'reconnect': await bench_reconnect(atrea, simulator, min(args.iterations, 5)),
+            'receive_msgs_per_sec': await bench_receive(atrea, simulator, args.messages),
+            'simulator': {
+                'received': simulator.received,
+                'sent': simulator.sent,
+                'dropped': simulator.dropped,
+            },
+        }
+        if atrea.metrics is not None:
+            report['metrics'] = atrea.metrics.as_dict()
+        if atrea.rate_limiter is not None:
+            report['rate_limiter'] = atrea.rate_limiter.as_dict()
+        await atrea.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.002, help="reply latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="random extra latency in seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability a reply is dropped")
+    parser.add_argument("--disconnect-after", type=int, default=None, help="close the connection after N requests")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="extra latency of maintenance and diagram reads")
+    parser.add_argument("--serial", action="store_true", help="the unit answers one request at a time")
+    parser.add_argument("--push-rate", type=float, default=0.0, help="ui_info events per second")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second, 0 disables the limiter")
+    parser.add_argument("--metrics", action="store_true", help="collect and report protocol metrics")
+    parser.add_argument("--record", metavar="PATH", help="write a capture of the session for replay")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"setup:      {report['setup_ms']:.1f} ms")
+    for name in ('refresh', 'slow_tiers', 'command', 'control_burst', 'command_under_load', 'reconnect'):
+        stats = report[name]
+        if 'count' not in stats:
+            print(f"{name + ':':<11} all {stats['errors']} runs failed")
+            continue
+        print(
+            f"{name + ':':<11} p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, "
+            f"p99 {stats['p99_ms']:.1f} ms over {stats['count']} runs, {stats['errors']} errors"
+        )
+    print(f"control writes per burst: {report['control_burst']['controls_per_burst']:.1f}")
+    print(f"receive():  {report['receive_msgs_per_sec']:.0f} msgs/s")
+    if 'rate_limiter' in report:
+        print(f"rate limiter: {report['rate_limiter']}")
+    if 'metrics' in report:
+        for endpoint, stats in sorted(report['metrics']['endpoints'].items()):
+            latency = stats['latency_ms']
+            print(
+                f"  {endpoint:<18} {stats['requests']:>5} requests, {stats['timeouts']} timeouts, "
+                f"{stats['errors']} errors, p50 {latency['p50']} ms, p99 {latency['p99']} ms"
+            )
+
+
+if __name__ == '__main__':
+    main()
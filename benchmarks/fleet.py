@@ -0,0 +1,151 @@
+""" Benchmark of many units polled through one shared request budget
+
+Every unit gets its own simulator, one of them never answers:
+
+    python -m benchmarks.fleet --units 100 --cycles 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import tracemalloc
+
+from pyamotion import AtreaClient, RequestBudget
+from pyamotion.const import FLEET_CONNECT_SPREAD, FLEET_MAX_REQUESTS, REQUEST_TIMEOUT
+from pyamotion.exporter import OpenMetricsExporter
+from pyamotion.fleet import stagger
+
+from .__main__ import percentiles, wait_for
+from .simulator import AtreaSimulator
+
+
+async def poll_unit(atrea, delay, interval, cycles, samples, timeout=REQUEST_TIMEOUT):
+    """Fetch the live tier every `interval` seconds, starting after `delay`,
+    giving up on a refresh after `timeout` seconds."""
+    await asyncio.sleep(delay)
+    for _ in range(cycles):
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                await atrea.fetch()
+        except Exception as err:  # pylint: disable=broad-except
+            atrea.health.record_failure(err)
+        else:
+            atrea.health.record_success()
+            samples.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+def bench_scrape(units, repeat=100):
+    """Time OpenMetrics scrapes of the fleet, the first one renders everything."""
+    exporter = OpenMetricsExporter()
+    for atrea in units:
+        exporter.add(atrea)
+    start = time.perf_counter()
+    exporter.render_blocks()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        exporter.render_blocks()
+    cached = (time.perf_counter() - start) / repeat
+    return {'first': first * 1e6, 'cached': cached * 1e6}
+
+
+async def run(args):
+    simulators = [
+        AtreaSimulator(latency=args.latency, jitter=args.jitter, seed=index)
+        for index in range(args.units)
+    ]
+    # one dead unit must not slow down the others
+    simulators[-1].drop_rate = 1.0
+    for simulator in simulators:
+        await simulator.start()
+
+    budget = RequestBudget(args.max_requests)
+    tracemalloc.start()
+    memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    units = [
+        AtreaClient(
+            simulator.url,
+            simulator.username,
+            simulator.password,
+            rate_limit=0,
+            shared_limit=budget,
+            start_delay=stagger(index, args.units, args.spread),
+        )
+        for index, simulator in enumerate(simulators)
+    ]
+    healthy = units[:-1]
+    await wait_for(lambda: all(atrea.logged_in for atrea in healthy), timeout=args.spread + 60)
+    setup = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - memory
+    tracemalloc.stop()
+
+    samples = []
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    await asyncio.gather(*(
+        poll_unit(atrea, stagger(index, args.units, args.interval), args.interval, args.cycles,
+                  samples if atrea is not units[-1] else [], args.timeout)
+        for index, atrea in enumerate(units)
+    ))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    scrape = bench_scrape(units)
+
+    report = {
+        'units': args.units,
+        'setup_ms': setup * 1000,
+        'fetch': percentiles(samples),
+        'budget': budget.as_dict(),
+        'memory_per_unit_kib': memory / args.units / 1024,
+        'cpu_per_cycle_ms': cpu / args.cycles * 1000,
+        'cpu_share': cpu / wall,
+        'scrape_us': scrape,
+        'failures': {
+            'healthy': sum(atrea.health.failures for atrea in healthy),
+            'dead': units[-1].health.failures,
+        },
+    }
+    await asyncio.gather(*(atrea.close() for atrea in units))
+    for simulator in simulators:
+        await simulator.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=5, help="live refreshes per unit")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between refreshes of a unit")
+    parser.add_argument("--spread", type=float, default=FLEET_CONNECT_SPREAD, help="seconds the connects are spread over")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds a refresh may take")
+    parser.add_argument("--max-requests", type=int, default=FLEET_MAX_REQUESTS, help="requests in flight across the fleet")
+    parser.add_argument("--latency", type=float, default=0.002, help="reply latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="random extra latency in seconds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.CRITICAL)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    fetch = report['fetch']
+    print(f"units:       {report['units']}")
+    print(f"setup:       {report['setup_ms']:.0f} ms")
+    print(f"fetch:       p50 {fetch['p50_ms']:.1f} ms, p95 {fetch['p95_ms']:.1f} ms over {fetch['count']} refreshes")
+    print(f"in flight:   peak {report['budget']['peak']} of {report['budget']['limit']}, "
+          f"{report['budget']['waited']} requests waited")
+    print(f"memory:      {report['memory_per_unit_kib']:.0f} KiB per unit")
+    print(f"cpu:         {report['cpu_per_cycle_ms']:.0f} ms per cycle, {report['cpu_share']:.1%} of one core")
+    print(f"failures:    {report['failures']['healthy']} healthy, {report['failures']['dead']} dead unit")
+    print(f"scrape:      {report['scrape_us']['first']:.0f} us first, {report['scrape_us']['cached']:.1f} us cached")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+""" Replay a recorded websocket session through AtreaClient
+
+Record a session with the `record_traffic` option or `python -m benchmarks
+--record session.jsonl`, then play it back:
+
+    python -m benchmarks.replay session.jsonl --speed 0 --profile
+"""
+
+import argparse
+import asyncio
+import cProfile
+import logging
+import pstats
+import time
+
+from pyamotion import AtreaClient
+from pyamotion.capture import ReplayTransport
+
+
+async def replay(path, speed, repeat):
+    """Feed the events of a capture to a fresh AtreaClient per repetition."""
+    report = {'events': 0, 'status_changes': 0, 'seconds': 0.0}
+    for _ in range(repeat):
+        transport = ReplayTransport.from_file(path, speed)
+        atrea = AtreaClient("replay://", "admin", "admin", transport=transport)
+        published = [atrea.status]
+
+        def on_status(immediate=False):
+            # what the live coordinator does before writing entities
+            if atrea.status.changed_since(published[-1]):
+                report['status_changes'] += 1
+            published.append(atrea.status)
+
+        atrea.set_status_listener(on_status)
+        async with asyncio.timeout(None if speed else 600):
+            while not atrea.logged_in:
+                await asyncio.sleep(0)
+            start = time.perf_counter()
+            await transport.finished.wait()
+        report['seconds'] += time.perf_counter() - start
+        report['events'] += transport.events
+        report['status'] = atrea.status.as_dict()
+        await atrea.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file written while recording")
+    parser.add_argument("--speed", type=float, default=0.0, help="playback speed, 0 is as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1, help="play the capture this many times")
+    parser.add_argument("--profile", action="store_true", help="print the top functions by cumulative time")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report = asyncio.run(replay(args.capture, args.speed, args.repeat))
+    if profiler:
+        profiler.disable()
+
+    rate = report['events'] / report['seconds'] if report['seconds'] else 0.0
+    print(f"events:         {report['events']}")
+    print(f"status changes: {report['status_changes']}")
+    print(f"throughput:     {rate:.0f} events/s")
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+""" In-process fake aMotion unit speaking the api/ws protocol """
+
+import asyncio
+import json
+import logging
+import random
+import secrets
+
+import websockets
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AtreaSimulator:
+    """Websocket server answering like an aMotion DUPLEX unit.
+
+    Faults can be injected to exercise the client:
+    latency/jitter delay every reply (seconds), slow_latency is added to the
+    maintenance and diagram reads, serial makes the unit answer one request
+    at a time like its single request handler, drop_rate is the probability
+    a request is never answered, disconnect_after closes the connection after
+    that many received requests and push_rate is the number of ui_info events
+    pushed per second.
+    """
+
+    def __init__(
+        self,
+        username="admin",
+        password="admin",
+        latency=0.0,
+        jitter=0.0,
+        drop_rate=0.0,
+        disconnect_after=None,
+        push_rate=0.0,
+        slow_latency=0.0,
+        serial=False,
+        max_flow=380,
+        seed=None,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.disconnect_after = disconnect_after
+        self.push_rate = push_rate
+        self.slow_latency = slow_latency
+        self.serial = serial
+        self.max_flow = max_flow
+        self._random = random.Random(seed)
+
+        self._server = None
+        self._connections = set()
+        self._tokens = set()
+        self.port = None
+
+        self.received = 0
+        self.sent = 0
+        self.dropped = 0
+        self.disconnects = 0
+        self.controls = 0
+
+        self.requests = {
+            'temp_request': 21.0,
+            'work_regime': 'VENTILATION',
+        }
+        if max_flow:
+            self.requests['flow_ventilation_req'] = 150
+        else:
+            self.requests['fan_power_req'] = 40
+        self.unit = {
+            'mode_current': 'NORMAL',
+            'season_current': 'HEATING',
+            'temp_eha': 8.1,
+            'temp_eta': 22.4,
+            'temp_ida': 22.4,
+            'temp_oda': 3.2,
+            'temp_oda_mean': 3.5,
+            'temp_sup': 19.6,
+        }
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def disconnect_all(self):
+        """Force every client connection closed."""
+        for websocket in list(self._connections):
+            self.disconnects += 1
+            await websocket.close()
+
+    async def _handler(self, websocket, *args):
+        self._connections.add(websocket)
+        pusher = None
+        handler_lock = asyncio.Lock() if self.serial else None
+        if self.push_rate:
+            pusher = asyncio.create_task(self._push_events(websocket))
+        received = 0
+        try:
+            async for frame in websocket:
+                self.received += 1
+                received += 1
+                if self.disconnect_after and received > self.disconnect_after:
+                    self.disconnects += 1
+                    await websocket.close()
+                    break
+                request = json.loads(frame)
+                if self.drop_rate and self._random.random() < self.drop_rate:
+                    self.dropped += 1
+                    continue
+                asyncio.create_task(self._reply(websocket, request, handler_lock))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._connections.discard(websocket)
+            if pusher:
+                pusher.cancel()
+
+    async def _reply(self, websocket, request, handler_lock=None):
+        if handler_lock is not None:
+            async with handler_lock:
+                await self._reply(websocket, request)
+            return
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if request.get('endpoint') in ('moments/get', 'ui_diagram_data'):
+            delay += self.slow_latency
+        if delay:
+            await asyncio.sleep(delay)
+        code, response = self._dispatch(request.get('endpoint'), request.get('args'))
+        await self._send(websocket, {
+            'code': code,
+            'error': None if code == 'OK' else code,
+            'id': request.get('id'),
+            'response': response,
+            'type': 'response',
+        })
+        if request.get('endpoint') == 'control' and code == 'OK':
+            await self._send(websocket, self._ui_info_event())
+
+    async def _send(self, websocket, message):
+        try:
+            await websocket.send(json.dumps(message))
+            self.sent += 1
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _push_events(self, websocket):
+        while True:
+            await asyncio.sleep(1 / self.push_rate)
+            self.unit['temp_oda'] = round(self.unit['temp_oda'] + self._random.uniform(-0.1, 0.1), 1)
+            await self._send(websocket, self._ui_info_event())
+
+    def _ui_info(self):
+        unit = dict(self.unit)
+        if self.max_flow:
+            unit['flow_eta'] = unit['flow_sup'] = self.requests['flow_ventilation_req']
+        else:
+            unit['fan_eta_factor'] = unit['fan_sup_factor'] = self.requests['fan_power_req']
+        return {'requests': dict(self.requests), 'states': {'active': {}}, 'unit': unit}
+
+    def _ui_info_event(self):
+        return {'args': self._ui_info(), 'event': 'ui_info', 'type': 'event'}
+
+    def _dispatch(self, endpoint, args):
+        match endpoint:
+            case 'login':
+                if args and 'token' in args:
+                    if args['token'] in self._tokens:
+                        return 'OK', None
+                    return 'UNAUTHORIZED', None
+                if args and args.get('username') == self.username \
+                        and args.get('password') == self.password:
+                    token = secrets.token_hex(16)
+                    self._tokens.add(token)
+                    return 'OK', token
+                return 'UNAUTHORIZED', None
+            case 'ui_control_scheme':
+                if self.max_flow:
+                    return 'OK', {
+                        'requests': {'flow_ventilation_req': {}, 'temp_request': {}},
+                        'types': {'flow_ventilation_req': {'min': 50, 'max': self.max_flow}},
+                    }
+                return 'OK', {'requests': {'fan_power_req': {}, 'temp_request': {}}, 'types': {}}
+            case 'ui_info':
+                return 'OK', self._ui_info()
+            case 'moments/get':
+                return 'OK', {
+                    'lastFilterReset': {'day': 1, 'month': 9, 'year': 2024},
+                    'inspection': {'day': 1, 'month': 3, 'year': 2025},
+                    'm1_register': 3600 * 12000,
+                    'm2_register': 3600 * 11800,
+                    'uv_lamp_register': 0,
+                }
+            case 'ui_diagram_data':
+                return 'OK', {'ui_diagram_data': {
+                    'bypass_estim': 0,
+                    'damper_io_state': True,
+                    'preheater_active': False,
+                    'preheater_factor': 0,
+                    'preheater_type': 'ELECTRO_PWM',
+                }}
+            case 'discovery':
+                return 'OK', {
+                    'activation_status': 'READY',
+                    'board_type': 'CL',
+                    'brand': 'atrea.cz',
+                    'name': 'DUPLEX 380 ECV5.aM-CL',
+                    'production_number': 'SIM0001',
+                    'type': 'DUPLEX 380 ECV5.aM-CL',
+                    'version': 'ATC-v2.3.0',
+                }
+            case 'version':
+                return 'OK', {'GATEWAY': {'version': 'ATC-v2.3.0'}}
+            case 'control':
+                self.controls += 1
+                self.requests.update((args or {}).get('variables', {}))
+                return 'OK', None
+            case 'time':
+                return 'OK', {'year': 2025, 'month': 1, 'day': 1, 'hour': 0, 'minute': 0}
+        return 'NOT_FOUND', None
@@ -1,288 +1,417 @@
 """ Module providing home assistant integration for Amotion Atrea Devices """
 
-import json
 import logging
 import asyncio
+from dataclasses import dataclass
 from datetime import timedelta, datetime
 
 from homeassistant.const import (
+    CONF_NAME,
     CONF_URL,
     CONF_PASSWORD,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
     Platform,
 )
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
 from homeassistant.components.climate import HVACMode
 
 from .const import (
+     CACHE_SAVE_INTERVAL,
+     CONF_COLLECT_METRICS,
+     CONF_KEEPALIVE_INTERVAL,
+     CONF_PUSH_INTERVAL,
+     CONF_RATE_LIMIT,
+     CONF_RECORD_TRAFFIC,
+     CONF_UNITS,
+     DEFAULT_COLLECT_METRICS,
+     DEFAULT_PUSH_INTERVAL,
+     DIAGRAM_INTERVAL,
      DOMAIN,
+     MAINTENANCE_INTERVAL,
+     POLL_INTERVAL,
+     PUSH_FALLBACK_INTERVAL,
+     STORAGE_VERSION,
+     TIER_TIMEOUT,
      TIMEOUT,
 )
-from .websocket import AtreaWebsocket
+from .fleet import FleetManager
+from .pyamotion import STATUS_FIELDS, AtreaClient, RequestBudget
+from .pyamotion.const import (
+     DEFAULT_KEEPALIVE_INTERVAL,
+     DEFAULT_RATE_LIMIT,
+     FLEET_CONNECT_SPREAD,
+     FLEET_MAX_REQUESTS,
+)
+from .pyamotion.fleet import stagger
 
 LOGGER = logging.getLogger(__name__)
 PLATFORMS = [Platform.CLIMATE, Platform.SENSOR]
 
+@dataclass
+class AmotionAtreaData:
+    """Unit and its coordinators, one per refresh tier."""
+
+    aatrea: "AmotionAtrea"
+    live: "AmotionAtreaCoordinator"
+    diagram: "AmotionAtreaDiagramCoordinator"
+    maintenance: "AmotionAtreaMaintenanceCoordinator"
+    # Configured name, prefix of the unique ids of the entities
+    name: str | None = None
+    # Fleet units are identified by their configured name, they are set up
+    # before the unit reported its own
+    fleet_unit: bool = False
+
+    @property
+    def coordinators(self):
+        return (self.live, self.diagram, self.maintenance)
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        atrea = self.aatrea
+        return DeviceInfo(
+            identifiers={(DOMAIN, self.name if self.fleet_unit else atrea.name)},
+            manufacturer=atrea.brand,
+            model=atrea.model,
+            name=self.name if self.fleet_unit else atrea.name,
+            sw_version=atrea.sw_version,
+            serial_number=atrea.serial,
+        )
+
+    async def async_refresh(self):
+        """Refresh all tiers at once."""
+        await asyncio.gather(*(coordinator.async_refresh() for coordinator in self.coordinators))
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Setup connection to atrea."""
-    try:
-        atrea = AmotionAtrea(hass,
-                             entry.data[CONF_URL],
-                             entry.data[CONF_USERNAME],
-                             entry.data[CONF_PASSWORD])
-    except Exception as e:
-        raise ConfigEntryNotReady from e
+    """Setup connection to atrea, or to every unit of a fleet."""
+    units = entry.data.get(CONF_UNITS)
+    if units:
+        fleet = FleetManager(RequestBudget(FLEET_MAX_REQUESTS))
+    else:
+        fleet = FleetManager()
+        units = [entry.data]
 
-    coordinator = AmotionAtreaCoordinator(hass, atrea)
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        for index, unit in enumerate(units):
+            fleet.add(await _async_setup_unit(hass, entry, fleet, unit, index, len(units)))
+    except Exception:
+        # Home Assistant retries the setup, the units set up so far must
+        # not keep their sessions open meanwhile
+        await asyncio.gather(*(data.aatrea.close() for data in fleet))
+        raise
     LOGGER.debug("thread is on")
+
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = coordinator
+    hass.data[DOMAIN][entry.entry_id] = fleet
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    if fleet.budget is not None:
+        _async_stagger_refreshes(hass, entry, fleet)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
+
+async def _async_setup_unit(hass, entry, fleet, unit, index, count) -> AmotionAtreaData:
+    """Connect one unit and create its coordinators."""
+    store_key = f"{DOMAIN}.{entry.entry_id}" if fleet.budget is None else f"{DOMAIN}.{entry.entry_id}.{index}"
+    store = Store(hass, STORAGE_VERSION, store_key)
+    # The client uses the cached token and metadata from its first login
+    cache = await store.async_load()
+    try:
+        atrea = AmotionAtrea(hass,
+                             unit[CONF_URL],
+                             unit[CONF_USERNAME],
+                             unit[CONF_PASSWORD],
+                             keepalive_interval=entry.options.get(
+                                 CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL
+                             ),
+                             collect_metrics=entry.options.get(
+                                 CONF_COLLECT_METRICS, DEFAULT_COLLECT_METRICS
+                             ),
+                             rate_limit=entry.options.get(
+                                 CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT
+                             ),
+                             shared_limit=fleet.budget,
+                             start_delay=stagger(index, count, FLEET_CONNECT_SPREAD),
+                             cache=cache)
+    except Exception as e:
+        raise ConfigEntryNotReady from e
+    # Stop the websocket and its tasks whenever the entry goes away, an
+    # options change reloads the entry and would leave a second session
+    entry.async_on_unload(atrea.close)
+    try:
+        return await _async_start_unit(hass, entry, fleet, unit, index, atrea, store, cache)
+    except Exception:
+        await atrea.close()
+        raise
+
+
+async def _async_start_unit(hass, entry, fleet, unit, index, atrea, store, cache):
+    """Create the coordinators of a connected unit and refresh them."""
+    suffix = "" if fleet.budget is None else f"_{index}"
+    if entry.options.get(CONF_RECORD_TRAFFIC, False):
+        atrea.start_recording(hass.config.path(
+            f"{DOMAIN}_{entry.entry_id}{suffix}_{datetime.now():%Y%m%d_%H%M%S}.jsonl"
+        ))
+
+    data = AmotionAtreaData(
+        atrea,
+        AmotionAtreaCoordinator(
+            hass,
+            atrea,
+            push_interval=entry.options.get(CONF_PUSH_INTERVAL, DEFAULT_PUSH_INTERVAL),
+        ),
+        AmotionAtreaDiagramCoordinator(hass, atrea),
+        AmotionAtreaMaintenanceCoordinator(hass, atrea),
+        name=unit.get(CONF_NAME),
+        fleet_unit=fleet.budget is not None,
+    )
+    entry.async_on_unload(data.live.async_stop_push)
+    if cache:
+        # Start from what the unit reported last time and revalidate in the
+        # background instead of waiting for login and the first refreshes.
+        for coordinator in data.coordinators:
+            coordinator.async_set_updated_data(atrea.status)
+        if fleet.budget is None:
+            entry.async_create_background_task(
+                hass, data.async_refresh(), "amotionatrea-revalidate"
+            )
+    elif fleet.budget is None:
+        # Only the live tier gates the setup, a slow or failing diagram or
+        # maintenance read must not delay it or make the entry not ready
+        await data.live.async_config_entry_first_refresh()
+        for coordinator in (data.diagram, data.maintenance):
+            entry.async_create_background_task(
+                hass, coordinator.async_refresh(), "amotionatrea-first-refresh"
+            )
+    # Fleet units are refreshed by _async_stagger_refreshes(), one slow unit
+    # must not hold up the setup of the others.
+
+    # What the next login needs is written as soon as it changes, the status
+    # only on a fixed interval.
+    saved = _static_cache(cache or {})
+
+    @callback
+    def async_save_cache(_now=None):
+        store.async_delay_save(atrea.export_cache, 0)
+
+    @callback
+    def async_check_cache():
+        nonlocal saved
+        current = _static_cache(atrea.export_cache())
+        if current != saved:
+            saved = current
+            async_save_cache()
+
+    for coordinator in data.coordinators:
+        entry.async_on_unload(coordinator.async_add_listener(async_check_cache))
+    entry.async_on_unload(async_track_time_interval(
+        hass, async_save_cache, timedelta(seconds=CACHE_SAVE_INTERVAL)
+    ))
+    # The recovered energy is a total increasing sensor, a restart or reload
+    # must continue from the last value instead of the last periodic save
+    @callback
+    def async_save_on_stop(_event):
+        # written by the final write of the Store at shutdown
+        async_save_cache()
+
+    async def async_save_on_unload():
+        await store.async_save(atrea.export_cache())
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_save_on_stop)
+    )
+    entry.async_on_unload(async_save_on_unload)
+    return data
+
+
+def _static_cache(cache: dict) -> dict:
+    """The cache without the status, which changes with every push."""
+    return {key: value for key, value in cache.items() if key != 'status'}
+
+
+@callback
+def _async_stagger_refreshes(hass, entry, fleet):
+    """Spread the first refresh of every fleet unit over its interval.
+
+    Coordinators schedule the next refresh one interval after the last one,
+    so the units stay spread out instead of polling in lockstep.
+    """
+    for index, data in enumerate(fleet):
+        for coordinator in data.coordinators:
+            delay = fleet.offset(index, coordinator.update_interval.total_seconds())
+
+            @callback
+            def async_refresh(_now, coordinator=coordinator):
+                entry.async_create_background_task(
+                    hass, coordinator.async_refresh(), "amotionatrea-fleet-refresh"
+                )
+
+            entry.async_on_unload(async_call_later(hass, delay, async_refresh))
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        # the clients are closed by the callbacks registered at setup
+        hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+    return unload_ok
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
 
-class AmotionAtreaCoordinator(DataUpdateCoordinator):
-    """AmotionAtrea custom coordinator."""
 
-    def __init__(self, hass, aatrea):
+class AtreaStatusCoordinator(DataUpdateCoordinator):
+    """Coordinator handing status snapshots of one refresh tier to entities.
+
+    `fetch` reads the tier from the unit and returns the new status.
+    `changed` names the status fields which changed with the last data handed
+    to the entities, so they can skip writing an unchanged state.
+    """
+
+    def __init__(self, hass, aatrea, name, update_interval, timeout, fetch):
         super().__init__(
             hass,
             LOGGER,
-            name="AmotionAtrea",
-            update_interval=timedelta(seconds=30),
-            always_update=True
+            name=name,
+            update_interval=update_interval,
+            always_update=False
         )
         self.aatrea = aatrea
+        self.changed = STATUS_FIELDS
+        self._timeout = timeout
+        self._fetch = fetch
 
     async def _async_update_data(self):
         """Fetch data from API endpoint."""
         try:
-            async with asyncio.timeout(TIMEOUT):
-                return await self.aatrea.fetch()
+            async with asyncio.timeout(self._timeout):
+                status = await self._fetch()
         except Exception as err:
+            self.aatrea.health.record_failure(err)
             raise UpdateFailed(f"Error communicating with API: {err}") from err
+        self.aatrea.health.record_success()
+        self.changed = status.changed_since(self.data)
+        return status
 
 
-class AmotionAtrea:
-    """Keep the AmotionAtrea instance in one place and centralize websocket use."""
+class AmotionAtreaCoordinator(AtreaStatusCoordinator):
+    """AmotionAtrea live data coordinator.
 
-    async def on_close(self) -> None:
-        LOGGER.debug("Reset counter")
-        self._msg_id = 0
+    With a push interval set, ui_info events pushed by the unit are handed to
+    the entities as they arrive (at most once per push interval) and polling
+    only runs as a slow liveness fallback.
+    """
 
-    async def on_connect(self):
-        LOGGER.debug("Connected")
-        self._hass.async_create_background_task(
-            self.login(), "amotionatrea-login"
+    def __init__(self, hass, aatrea, push_interval=DEFAULT_PUSH_INTERVAL):
+        super().__init__(
+            hass,
+            aatrea,
+            "AmotionAtrea",
+            timedelta(seconds=PUSH_FALLBACK_INTERVAL if push_interval else POLL_INTERVAL),
+            TIMEOUT,
+            aatrea.fetch,
         )
+        self._push_interval = push_interval
+        self._last_push = 0.0
+        self._push_handle = None
+        aatrea.set_status_listener(self._async_handle_push)
+
+    @callback
+    def _async_handle_push(self, immediate=False):
+        """Publish pushed status, debounced to the push interval.
 
-    async def receive(self, message):
-        """ Sample responses we get:
-        {'args': {'active': False, 'countdown': 0, 'finish': {'day': 0, 'hour': 0, 'minute': 0, 'month': 0, 'year': 0}, 'sceneId': 0, 'start': {'day': 0, 'hour': 0, 'minute': 0, 'month': 0, 'year': 0}}, 'event': 'disposable_plan', 'type': 'event'} #pylint: disable=line-too-long
-        {'code': 'OK', 'error': None, 'id': None, 'response': {'ui_diagram_data': {'bypass_estim': 100, 'damper_io_state': True, 'fan_eta_operating_time': 24, 'fan_sup_operating_time': 24, 'preheater_active': False, 'preheater_factor': 0, 'preheater_type': 'ELECTRO_PWM'}}, 'type': 'response'} #pylint: disable=line-too-long
-        {'code': 'OK', 'error': None, 'id': 4, 'response': {'requests': {'fan_power_req': 60, 'temp_request': 22.0, 'work_regime': 'VENTILATION'}, 'states': {'active': {}}, 'unit': {'fan_eta_factor': 60, 'fan_sup_factor': 60, 'mode_current': 'NORMAL', 'season_current': 'NON_HEATING', 'temp_eha': 23.0, 'temp_eta': 23.0, 'temp_ida': 23.0, 'temp_oda': 16.2, 'temp_oda_mean': 16.275, 'temp_sup': 17.5}}, 'type': 'response'} #pylint: disable=line-too-long
-        {'args': {'requests': {'fan_power_req': 30, 'temp_request': 18.5, 'work_regime': 'VENTILATION'}, 'states': {'active': {}}, 'unit': {'fan_eta_factor': 30, 'fan_sup_factor': 30, 'mode_current': 'NORMAL', 'season_current': 'NON_HEATING', 'temp_eha': 23.9, 'temp_eta': 23.9, 'temp_ida': 23.9, 'temp_oda': 22.9, 'temp_oda_mean': 22.25, 'temp_sup': 23.3}}, 'event': 'ui_info', 'type': 'event'} #pylint: disable=line-too-long
-        {"code":"UNAUTHORIZED","error":"Unauthorized: No authorized user (or missing token)","id":9,"response":null,"type":"response"} #pylint: disable=line-too-long
+        Immediate updates, e.g. optimistic command results, are published
+        right away, also when push updates are disabled.
         """
-        LOGGER.debug("receive message: %s", message)
-        if 'id' in message and message['id']:
-            if message['code'] == 'UNAUTHORIZED':
-                LOGGER.debug("BORK")
-                raise ConfigEntryNotReady("UNAUTHORIZED")
-            self._messages[message['id']] = message['response']
-            LOGGER.debug("Stored messages: %s", self._messages)
-        elif message['type'] == 'event' and message['event'] == 'ui_info' and self.logged_in:
-            await self._update_status(message)
-
-    async def _update_status(self, message):
-        self.status['current_temperature'] = message['args']['unit']['temp_sup']
-        self.status['setpoint'] = message['args']['requests']['temp_request']
-        self.status['temp_oda'] = message['args']['unit']['temp_oda']
-        self.status['temp_ida'] = message['args']['unit']['temp_ida']
-        self.status['temp_eha'] = message['args']['unit']['temp_eha']
-        self.status['temp_eta'] = message['args']['unit']['temp_eta']
-        self.status['temp_sup'] = message['args']['unit']['temp_sup']
-        self.status['season_current'] = message['args']['unit']['season_current']
-        self.status['last_update'] = datetime.now()
-
-        if self._max_flow:
-            self.status['fan_mode'] = round(
-                float(message['args']['requests']['flow_ventilation_req']) /
-                (float(self._max_flow) / 100), -1
-            )
-            self.status['fan_eta_factor'] = round(
-                float(message['args']['unit']['flow_eta']) /
-                (float(self._max_flow) / 100), -1
-            )
-            self.status['fan_sup_factor'] = round(
-                float(message['args']['unit']['flow_sup']) /
-                (float(self._max_flow) / 100), -1
-            )
+        if immediate:
+            if self._push_handle is not None:
+                self._push_handle.cancel()
+            self._async_publish_push()
+            return
+        if not self._push_interval or self._push_handle is not None:
+            return
+        delay = self._last_push + self._push_interval - self.hass.loop.time()
+        if delay > 0:
+            self._push_handle = self.hass.loop.call_later(delay, self._async_publish_push)
         else:
-            self.status['fan_eta_factor'] = message['args']['unit']['fan_eta_factor']
-            self.status['fan_sup_factor'] = message['args']['unit']['fan_sup_factor']
-            self.status['fan_mode'] = message['args']['requests']['fan_power_req']
-
-    async def update(self, message_id=None):
-        LOGGER.debug("update %s", message_id)
-        if message_id:
-            try:
-                async with asyncio.timeout(30):
-                    for i in range(30):
-                        if message_id in self._messages:
-                            msg = self._messages[message_id]
-                            del self._messages[message_id]
-                            LOGGER.debug("Found message %s", msg)
-                            return msg
-                        await asyncio.sleep(1)
-            except asyncio.TimeoutError:
-                LOGGER.debug("Timeout while waiting for message_id: %s", message_id)
-
-    async def fetch(self):
-        if self._max_flow:
-            await self.time()
-        LOGGER.debug(self.status['last_update'])
-
-        if self.status['current_temperature'] is None or (
-            datetime.now() - self.status['last_update'] >= timedelta(minutes=2)
-        ):
-            try:
-                async with asyncio.timeout(60):
-                    while not self.logged_in:
-                        await asyncio.sleep(1)
-            except asyncio.TimeoutError:
-                LOGGER.debug("Timeout while waiting for login")
-
-            response_id = await self.send('{"endpoint": "ui_info", "args": null}')
-            message = await self.update(response_id)
-            if message:
-                # mingle the message to use single function to update status
-                message["args"] = message
-                await self._update_status(message)
-        # Get maintenance data and ui_diagram_data every 5 minutes
-        if datetime.now() - self.status['last_maintenance_update'] >= timedelta(minutes=5):
-            await self.async_get_maintenance_data()
-            await self.async_get_diagram_data()
-
-    async def send(self, message):
-        msg = json.loads(message)
-        msg['id'] = self._msg_id = self._msg_id + 1
-        LOGGER.debug("MSG: %s", msg)
+            self._async_publish_push()
+
+    @callback
+    def _async_publish_push(self):
+        self._push_handle = None
+        self._last_push = self.hass.loop.time()
+        status = self.aatrea.status
+        changed = status.changed_since(self.data)
+        if not changed and self.last_update_success:
+            return
+        # async_set_updated_data() would also postpone the next poll, and with
+        # a steady event stream the fallback poll would never run. Only hand
+        # the data to the listeners.
+        self.changed = changed
+        self.data = status
+        self.last_update_success = True
+        self.async_update_listeners()
+
+    @callback
+    def async_stop_push(self):
+        """Stop reacting to pushed events."""
+        self.aatrea.set_status_listener(None)
+        if self._push_handle is not None:
+            self._push_handle.cancel()
+            self._push_handle = None
+
+
+class AmotionAtreaDiagramCoordinator(AtreaStatusCoordinator):
+    """Refreshes ui_diagram_data (bypass, preheater)."""
 
-        try:
-            async with asyncio.timeout(TIMEOUT):
-                await self._websocket.send(json.dumps(msg))
-        except TimeoutError as err:
-            LOGGER.debug("Connection to %s timed out", self._url)
-            raise ConfigEntryNotReady from err
-
-        return msg['id']
-
-
-    async def async_get_discovery(self):
-        response_id = await self.send('{"endpoint": "discovery", "args": null}')
-        discovery_data = await self.update(response_id)
-        # Sample data:
-        # {'activation_status': 'READY', 'addresses': {'eth0': ['172.20.20.20', '192.168.0.11']}, 'board_number': '0c:2g:b3:0d:11:0a', 'board_type': 'CL', 'brand': 'atrea.cz', 'cloud': {'enable': False, 'link': 'https://amotion.cloud', 'support': True}, 'commissioned': False, 'initialized': True, 'localisation': 'cs', 'name': 'DUPLEX 380 ECV5.aM-CL', 'port': 80, 'production_number': 'FFFFFFF', 'service_name': '', 'type': 'DUPLEX 380 ECV5.aM-CL', 'version': 'ATC-v2.3.0'} #pylint: disable=line-too-long
-        if discovery_data:
-            self.model = discovery_data.get('type', 'Unknown')
-            self.serial = discovery_data.get('production_number', 'Unknown')
-            self.brand = discovery_data.get('brand', 'Atrea')
-            self.name = discovery_data.get('name', 'Atrea')
-
-    async def async_get_version(self):
-        response_id = await self.send('{"endpoint": "version", "args": null}')
-        version_data = await self.update(response_id)
-        if version_data:
-            if 'GATEWAY' in version_data and 'version' in version_data['GATEWAY']:
-                self.sw_version = version_data['GATEWAY']['version']
-            else:
-                self.sw_version = 'unknown'
-
-    async def login(self):
-        LOGGER.debug("Sending login to get token")
-        msg_id = await self.send(
-            f'{{"endpoint":"login","args":' \
-            f'{{"username":"{self._username}","password":"{self._password}"}}}}'
+    def __init__(self, hass, aatrea):
+        super().__init__(
+            hass,
+            aatrea,
+            "AmotionAtrea diagram",
+            timedelta(seconds=DIAGRAM_INTERVAL),
+            TIER_TIMEOUT,
+            aatrea.fetch_diagram,
         )
-        token = await self.update(message_id=msg_id)
-        LOGGER.debug("Token is %s", token)
-        await self.send(f'{{"endpoint":"login","args":{{"token":"{token}"}}}}')
-        await self.ui_scheme()
-        self.logged_in = True
-
-        await self.async_get_discovery()
-        await self.async_get_version()
-
-    async def ui_scheme(self):
-        response_id = await self.send('{"endpoint": "ui_control_scheme", "args": null}')
-        control_scheme = await self.update(response_id)
-        if 'flow_ventilation_req' in control_scheme['requests']:
-            self._max_flow = control_scheme['types']['flow_ventilation_req']['max']
-            self._min_flow = control_scheme['types']['flow_ventilation_req']['min']
-
-    async def async_get_diagram_data(self):
-        """Fetch diagram data including bypass_estim from the server."""
-        response_id = await self.send('{"endpoint": "ui_diagram_data", "args": null}')
-        diagram_response = await self.update(response_id)
-        if diagram_response:
-            # The server returns `ui_diagram_data` as a nested key in the response
-            ui_diagram = diagram_response.get('ui_diagram_data', {})
-            self.status['bypass_estim'] = ui_diagram.get('bypass_estim', 0)
-            self.status['preheater_factor'] = ui_diagram.get('preheater_factor', 0)
-
-    async def async_get_maintenance_data(self):
-        """ Get maintenance information like filter change dates and motor hours """
-        response_id = await self.send('{"endpoint": "moments/get", "args": null}')
-        moment_data = await self.update(response_id)
-        self.status['last_maintenance_update'] = datetime.now()
-        self.status['filters_last_change'] = moment_data.get('lastFilterReset', {})
-        self.status['inspection_date'] = moment_data.get('inspection', {})
-
-        self.status['motor1_hours'] = round(moment_data['m1_register'] / 3600)
-        self.status['motor2_hours'] = round(moment_data['m2_register'] / 3600)
-        # UV lamp operating hours
-        if 'uv_lamp_register' in moment_data and moment_data['uv_lamp_register'] > 0:
-            self.status['uv_lamp_hours'] = round(moment_data['uv_lamp_register'] / 3600)
-            self.has_uv_lamp = True
-        else:
-            self.status['uv_lamp_hours'] = None
-            self.has_uv_lamp = False
-
-    async def time(self):
-        response_id = await self.send('{"endpoint":"time", "args": null}')
-        message = await self.update(response_id)
-        LOGGER.debug("TIME %s", message)
-
-    async def ws_connect(self) -> None:
-        """Connect the websocket."""
-        await self._websocket.connect(self.on_connect, self.receive, self.on_close)
-
-    async def set_fan_mode(self, fan_mode):
-        if self._max_flow:
-            flow_request = (float(self._max_flow) / 100) * int(fan_mode)
-            flow_request = max(flow_request, self._min_flow)
-            control = json.dumps({'variables': {"flow_ventilation_req": int(flow_request)}})
-        else:
-            control = json.dumps({'variables': {"fan_power_req": int(fan_mode)}})
-        response_id = await self.send(f'{{ "endpoint": "control", "args": {control} }}')
-        await self.update(response_id)
 
-    async def set_temperature(self, temperature):
-        control = json.dumps({'variables': {'temp_request': int(temperature)}})
-        response_id = await self.send('{ "endpoint": "control", "args": %s }' % control)
-        await self.update(response_id)
+
+class AmotionAtreaMaintenanceCoordinator(AtreaStatusCoordinator):
+    """Refreshes the slow maintenance counters and dates."""
+
+    def __init__(self, hass, aatrea):
+        super().__init__(
+            hass,
+            aatrea,
+            "AmotionAtrea maintenance",
+            timedelta(seconds=MAINTENANCE_INTERVAL),
+            TIER_TIMEOUT,
+            aatrea.fetch_maintenance,
+        )
+
+
+class AmotionAtrea(AtreaClient):
+    """AtreaClient running its tasks as Home Assistant background tasks."""
+
+    def __init__(self, hass, url: str, username: str, password: str, **kwargs) -> None:
+        super().__init__(
+            url,
+            username,
+            password,
+            create_task=hass.async_create_background_task,
+            **kwargs,
+        )
 
     async def set_hvac_mode(self, hvac_mode):
         """
@@ -294,65 +423,4 @@ class AmotionAtrea:
                 mode = 'VENTILATION'
             case HVACMode.AUTO:
                 mode = 'AUTO'
-        control = json.dumps({'variables': {"work_regime": mode}})
-        response_id = await self.send('{ "endpoint": "control", "args": %s }' % control)
-        await self.update(response_id)
-
-    def __init__(
-        self,
-        hass,
-        url: str,
-        username: str,
-        password: str
-    ) -> None:
-        self._hass = hass
-        self._url = url
-        self._username = username
-        self._password = password
-
-        self._available = True
-        self.logged_in = False
-        self._msg_id = 0
-        self._messages = {}
-        self._websocket = AtreaWebsocket(url)
-        self._max_flow = None
-        self._min_flow = None
-        self.has_uv_lamp = False
-
-        self.status = {
-            'state': None,
-            'current_temperature': None,
-            'setpoint': None,
-            'mode': None,
-            'current_hvac_mode': HVACMode.AUTO,
-            'fan_mode': None,
-            'temp_oda': None,
-            'temp_ida': None,
-            'temp_eha': None,
-            'fan_eta_factor': None,
-            'fan_sup_factor': None,
-            'temp_sup': None,
-            'temp_eta': None,
-            'season_current': None,
-            'last_update': None,
-            'has_heater': False,
-            'has_cooler': False,
-            'filters_last_change': {},
-            'inspection_date': {},
-            'motor1_hours': 0,
-            'motor2_hours': 0,
-            'uv_lamp_hours': None,
-            'last_maintenance_update': datetime.min,
-            'bypass_estim': 0,
-            'preheater_factor': 0,
-        }
-
-        self.model = None
-        self.sw_version = None
-        self.serial = None
-        self.brand = "Atrea"
-        self.name = "Atrea"
-
-        self._hass.async_create_background_task(
-            self.ws_connect(), "amotionatrea-ws_connect"
-        )
+        await self.set_work_regime(mode)
@@ -1,9 +1,8 @@
 import logging
 from typing import Callable
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.components.climate.const import HVACAction
 
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -14,12 +13,12 @@ from homeassistant.components.climate import (
 )
 
 from homeassistant.const import (
-    CONF_NAME,
     UnitOfTemperature,
     ATTR_TEMPERATURE
 )
 
-from . import AmotionAtreaCoordinator
+from . import AmotionAtreaCoordinator, AmotionAtreaData
+from .fleet import FleetManager
 from .const import (
     DOMAIN,
     SUPPORT_FLAGS,
@@ -29,16 +28,26 @@ from .const import (
 
 LOGGER = logging.getLogger(__name__)
 
+# Status fields the climate entity shows
+CLIMATE_FIELDS = frozenset(
+    {'season_current', 'work_regime', 'current_temperature', 'setpoint', 'fan_mode'}
+)
+# Work regimes written by async_set_hvac_mode
+WORK_REGIME_HVAC_MODES = {
+    'OFF': HVACMode.OFF,
+    'AUTO': HVACMode.AUTO,
+    'VENTILATION': HVACMode.HEAT_COOL,
+}
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
     async_add_entities: Callable,
 ):
-    sensor_name = entry.data.get(CONF_NAME)
-
-    coordinator: AmotionAtreaCoordinator = hass.data[DOMAIN][entry.entry_id]
-    entities: list[AAtreaDevice] = [AAtreaDevice(coordinator, sensor_name)]
-    async_add_entities(entities, update_before_add=True)
+    fleet: FleetManager = hass.data[DOMAIN][entry.entry_id]
+    entities: list[AAtreaDevice] = [AAtreaDevice(data) for data in fleet]
+    # the coordinators already hold the first refresh or the cached status
+    async_add_entities(entities)
 
 
 class AAtreaDevice(
@@ -47,31 +56,45 @@ class AAtreaDevice(
     _attr_has_entity_name = True
     _attr_supported_features = SUPPORT_FLAGS
 
-    def __init__(self, coordinator, sensor_name):
-        super().__init__(coordinator)
-        self._atrea = coordinator.aatrea
-        self._attr_name = self._atrea.name
-        self._attr_unique_id = f"{sensor_name}-{self._atrea.name}"
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self._atrea.name)},
-            manufacturer=self._atrea.brand,
-            model=self._atrea.model,
-            name=self._atrea.name,
-            sw_version=self._atrea.sw_version,
-            serial_number=self._atrea.serial,
-        )
+    def __init__(self, data: AmotionAtreaData):
+        super().__init__(data.live)
+        self._atrea = data.aatrea
+        if data.fleet_unit:
+            # the unit may not have reported its name yet
+            self._attr_name = data.name
+            self._attr_unique_id = f"{data.name}-climate"
+        else:
+            self._attr_name = self._atrea.name
+            self._attr_unique_id = f"{data.name}-{self._atrea.name}"
+        self._attr_device_info = data.device_info
+        self._last_available = True
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only when a field we show changed."""
+        if (
+            not CLIMATE_FIELDS.isdisjoint(self.coordinator.changed)
+            or self.available != self._last_available
+        ):
+            self._last_available = self.available
+            self.async_write_ha_state()
 
     @property
     def temperature_unit(self):
         return UnitOfTemperature.CELSIUS
 
     @property
-    def hvac_mode(self) -> HVACMode:
+    def hvac_mode(self) -> HVACMode | None:
         """Return hvac operation ie. heat, cool mode.
 
         FIXME this should be returning based on UI control scheme
         """
-        match self._atrea.status['season_current']:
+        if self._atrea.status.work_regime in WORK_REGIME_HVAC_MODES:
+            return WORK_REGIME_HVAC_MODES[self._atrea.status.work_regime]
+        if self._atrea.status.work_regime is None and self._atrea.status.season_current is None:
+            # nothing reported yet
+            return None
+        match self._atrea.status.season_current:
             case "HEATING":
                 return HVACMode.HEAT
             case "NON_HEATING":
@@ -86,9 +109,11 @@ class AAtreaDevice(
         return self._attr_name
 
     @property
-    def hvac_action(self) -> HVACAction:
+    def hvac_action(self) -> HVACAction | None:
         """Return current hvac i.e. heat, cool, idle."""
-        match self._atrea.status['season_current']:
+        if self._atrea.status.season_current is None:
+            return None
+        match self._atrea.status.season_current:
             case "HEATING":
                 return HVACAction.HEATING
             case "NON_HEATING":
@@ -104,30 +129,30 @@ class AAtreaDevice(
     @property
     def current_temperature(self):
         """Return the current temperature."""
-        return self._atrea.status['current_temperature']
+        return self._atrea.status.current_temperature
 
     @property
     def target_temperature(self):
         """Return the temperature we try to reach."""
-        return self._atrea.status['setpoint']
+        return self._atrea.status.setpoint
 
     async def async_set_temperature(self, **kwargs):
         """Set new target temperature."""
         await self._atrea.set_temperature(kwargs.get(ATTR_TEMPERATURE))
-        await self.coordinator.async_request_refresh()
 
 
     async def async_set_hvac_mode(self, hvac_mode):
         """Set new target hvac mode."""
         await self._atrea.set_hvac_mode(hvac_mode)
-        await self.coordinator.async_request_refresh()
 
     @property
     def fan_mode(self):
         """Return the current fan mode."""
+        if self._atrea.status.fan_mode is None:
+            return None
         # round to 5
         base = 5
-        return str(base * round(float(self._atrea.status['fan_mode'])/base))
+        return str(base * round(float(self._atrea.status.fan_mode)/base))
 
     @property
     def fan_modes(self):
@@ -136,4 +161,3 @@ class AAtreaDevice(
     async def async_set_fan_mode(self, fan_mode):
         """Set new target fan mode."""
         await self._atrea.set_fan_mode(fan_mode)
-        await self.coordinator.async_request_refresh()
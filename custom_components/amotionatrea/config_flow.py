@@ -12,8 +12,8 @@ from homeassistant.const import (
     CONF_PASSWORD,
 )
 from homeassistant import config_entries
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
-from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers.update_coordinator import UpdateFailed
 from homeassistant.helpers.selector import (
     TextSelector,
@@ -22,10 +22,25 @@ from homeassistant.helpers.selector import (
 )
 
 from . import AmotionAtrea  # Import the custom class from __init__.py
-from .const import DOMAIN
+from .const import (
+    CONF_COLLECT_METRICS,
+    CONF_KEEPALIVE_INTERVAL,
+    CONF_PUSH_INTERVAL,
+    CONF_RATE_LIMIT,
+    CONF_RECORD_TRAFFIC,
+    CONF_UNITS,
+    DEFAULT_COLLECT_METRICS,
+    DEFAULT_PUSH_INTERVAL,
+    DOMAIN,
+)
+from .pyamotion import AtreaError
+from .pyamotion.const import DEFAULT_KEEPALIVE_INTERVAL, DEFAULT_RATE_LIMIT
 
 LOGGER = logging.getLogger(__name__)
 
+CONF_FLEET = "fleet"
+CONF_ADD_ANOTHER = "add_another"
+
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(
@@ -34,9 +49,42 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
         ): TextSelector(TextSelectorConfig(type=TextSelectorType.URL)),
         vol.Required(CONF_USERNAME): str,
         vol.Required(CONF_PASSWORD): str,
+        vol.Optional(CONF_FLEET, default=False): bool,
     }
 )
 
+
+def _fleet_unit_schema(username):
+    return vol.Schema(
+        {
+            vol.Required(CONF_NAME): str,
+            vol.Required(
+                CONF_URL,
+                description={"suggested_value": "ws://192.168.1.101:8080"},
+            ): TextSelector(TextSelectorConfig(type=TextSelectorType.URL)),
+            vol.Required(CONF_USERNAME, default=username): str,
+            vol.Required(CONF_PASSWORD): str,
+            vol.Optional(CONF_ADD_ANOTHER, default=True): bool,
+        }
+    )
+
+
+async def _async_check_url(url) -> str | None:
+    """Error key when the url is malformed or nothing listens there."""
+    parsed_url = urlparse(url)
+    if parsed_url.scheme not in ("ws", "wss") or parsed_url.hostname is None:
+        return "invalid_url_format"
+    port = parsed_url.port or (80 if parsed_url.scheme == "ws" else 443)
+    try:
+        async with asyncio.timeout(10):
+            _, writer = await asyncio.open_connection(parsed_url.hostname, port)
+            writer.close()
+            await writer.wait_closed()
+    except Exception:
+        LOGGER.debug("Could not connect to %s", url, exc_info=True)
+        return "cannot_connect"
+    return None
+
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Amotion Atrea integration."""
 
@@ -49,6 +97,15 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.username: str | None = None
         self.password: str | None = None
         self.atrea: AmotionAtrea | None = None
+        self.fleet = False
+        # units of a fleet entry collected so far
+        self.units: list[dict] = []
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
 
     async def async_migrate_entry(hass, config_entry: config_entries.ConfigEntry):
         """Migrate old entry."""
@@ -85,6 +142,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.name = user_input.get(CONF_NAME, self.url)
         self.username = user_input.get(CONF_USERNAME, self.username)
         self.password = user_input.get(CONF_PASSWORD, self.password)
+        self.fleet = user_input.get(CONF_FLEET, self.fleet)
 
         errors: dict[str, str] = {}
 
@@ -140,7 +198,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 await self.atrea.fetch()
                 if not self.atrea.logged_in:
                     errors["base"] = "invalid_auth"
-            except (UpdateFailed, ConfigEntryNotReady) as e:
+            except (UpdateFailed, AtreaError) as e:
                 # Handle specific unauthorized error message
                 if "UNAUTHORIZED" in str(e):
                     errors["base"] = "invalid_auth"
@@ -150,10 +208,13 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 LOGGER.exception("Unexpected error during login: %s", e)
                 errors["base"] = "unknown"
 
+        if self.atrea:
+            # only the device name is needed from here on
+            await self.atrea.close()
+
         # Show form again with errors
         if errors:
-            if self.atrea:
-                del self.atrea  # Clean up before retrying
+            self.atrea = None  # Clean up before retrying
             return self.async_show_form(
                 step_id="user",
                 data_schema=STEP_USER_DATA_SCHEMA,
@@ -176,13 +237,89 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 data_schema=name_step_schema
             )
 
-        return self.async_create_entry(
-            title=f"{self.name}",
-            data={
-                CONF_URL: self.url,
-                CONF_USERNAME: self.username,
-                CONF_PASSWORD: self.password,
-                CONF_NAME: user_input.get(CONF_NAME, self.name),
-            },
+        unit = {
+            CONF_URL: self.url,
+            CONF_USERNAME: self.username,
+            CONF_PASSWORD: self.password,
+            CONF_NAME: user_input.get(CONF_NAME, self.name),
+        }
+        if self.fleet:
+            self.name = unit[CONF_NAME]
+            self.units = [unit]
+            return await self.async_step_fleet()
+        return self.async_create_entry(title=f"{self.name}", data=unit)
+
+    async def async_step_fleet(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Add further units to a fleet entry, one per form."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            url = user_input[CONF_URL]
+            if not url.endswith("/"):
+                url += "/"
+            if any(unit[CONF_NAME] == user_input[CONF_NAME] for unit in self.units):
+                errors[CONF_NAME] = "name_exists"
+            elif error := await _async_check_url(url):
+                errors["base"] = error
+            else:
+                self.units.append({
+                    CONF_URL: url,
+                    CONF_USERNAME: user_input[CONF_USERNAME],
+                    CONF_PASSWORD: user_input[CONF_PASSWORD],
+                    CONF_NAME: user_input[CONF_NAME],
+                })
+                if not user_input[CONF_ADD_ANOTHER]:
+                    return self.async_create_entry(
+                        title=f"{self.name} ({len(self.units)} units)",
+                        data={CONF_NAME: self.name, CONF_UNITS: self.units},
+                    )
+
+        return self.async_show_form(
+            step_id="fleet",
+            data_schema=_fleet_unit_schema(self.username),
+            errors=errors,
+            description_placeholders={"units": str(len(self.units))},
         )
 
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Amotion Atrea options."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_PUSH_INTERVAL,
+                        default=options.get(CONF_PUSH_INTERVAL, DEFAULT_PUSH_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300)),
+                    vol.Optional(
+                        CONF_KEEPALIVE_INTERVAL,
+                        default=options.get(
+                            CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300)),
+                    vol.Optional(
+                        CONF_RATE_LIMIT,
+                        default=options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                    vol.Optional(
+                        CONF_COLLECT_METRICS,
+                        default=options.get(CONF_COLLECT_METRICS, DEFAULT_COLLECT_METRICS),
+                    ): bool,
+                    vol.Optional(
+                        CONF_RECORD_TRAFFIC,
+                        default=options.get(CONF_RECORD_TRAFFIC, False),
+                    ): bool,
+                }
+            ),
+        )
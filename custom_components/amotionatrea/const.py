@@ -3,9 +3,38 @@ from homeassistant.components.climate import (
     ClimateEntityFeature,
 )
 
+from .pyamotion.const import REQUEST_TIMEOUT
+
 DOMAIN = "amotionatrea"
+STORAGE_VERSION = 1
+# Seconds between writes of the cached status, it changes with every push
+CACHE_SAVE_INTERVAL = 300
 TIMEOUT = 120
 
+CONF_RATE_LIMIT = "rate_limit"
+
+CONF_PUSH_INTERVAL = "push_interval"
+# Minimum seconds between two pushed updates, 0 disables push updates
+DEFAULT_PUSH_INTERVAL = 5
+POLL_INTERVAL = 30
+# Polling only checks the unit is alive when it pushes its state
+PUSH_FALLBACK_INTERVAL = 120
+
+CONF_KEEPALIVE_INTERVAL = "keepalive_interval"
+
+CONF_COLLECT_METRICS = "collect_metrics"
+# Per-endpoint request and frame statistics for diagnostics
+DEFAULT_COLLECT_METRICS = False
+# Write the websocket traffic to a capture file in the configuration directory
+CONF_RECORD_TRAFFIC = "record_traffic"
+# Slow refresh tiers, they never hold up the live data
+DIAGRAM_INTERVAL = 120
+MAINTENANCE_INTERVAL = 900
+TIER_TIMEOUT = 2 * REQUEST_TIMEOUT
+
+# Config entry data of a fleet, a list of units with url, credentials and name
+CONF_UNITS = "units"
+
 SUPPORT_FLAGS = (
     ClimateEntityFeature.FAN_MODE
     | ClimateEntityFeature.TARGET_TEMPERATURE
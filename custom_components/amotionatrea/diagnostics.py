@@ -0,0 +1,47 @@
+""" Diagnostics download of the Amotion Atrea integration """
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME, "serial"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    fleet = hass.data[DOMAIN][entry.entry_id]
+    diagnostics = {"entry": async_redact_data(entry.as_dict(), TO_REDACT)}
+    if fleet.budget is None:
+        diagnostics.update(_unit_diagnostics(fleet.units[0]))
+    else:
+        diagnostics["fleet"] = fleet.as_dict()
+        diagnostics["units"] = {data.name: _unit_diagnostics(data) for data in fleet}
+    return diagnostics
+
+
+def _unit_diagnostics(data) -> dict[str, Any]:
+    atrea = data.aatrea
+    return {
+        "device": async_redact_data(atrea.export_cache()["device"], TO_REDACT),
+        "connection": atrea.connection_info(),
+        "health": atrea.health.as_dict(),
+        "coordinators": {
+            coordinator.name: {
+                "last_update_success": coordinator.last_update_success,
+                "update_interval": coordinator.update_interval.total_seconds(),
+            }
+            for coordinator in data.coordinators
+        },
+        "status": atrea.status.as_dict(),
+        "metrics": atrea.metrics.as_dict() if atrea.metrics is not None else None,
+        "trace": atrea.trace.export(),
+    }
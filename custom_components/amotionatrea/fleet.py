@@ -0,0 +1,38 @@
+""" Many units of one config entry sharing one request budget """
+
+from .pyamotion.fleet import RequestBudget, stagger
+
+
+class FleetManager:
+    """The units of one config entry.
+
+    A plain entry is a fleet of one unit without a shared budget. With more
+    units every request also takes a slot of the shared `budget`, and the
+    connects and polls of the units are spread evenly over their interval
+    instead of all firing at once.
+    """
+
+    def __init__(self, budget: RequestBudget | None = None) -> None:
+        self.budget = budget
+        # AmotionAtreaData of every unit, in configuration order
+        self.units = []
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def __len__(self):
+        return len(self.units)
+
+    def add(self, data) -> None:
+        self.units.append(data)
+
+    def offset(self, index: int, interval: float) -> float:
+        """Delay of the `index`-th unit so units are spread over `interval`."""
+        return stagger(index, len(self.units), interval)
+
+    def as_dict(self) -> dict:
+        return {
+            "units": len(self.units),
+            "budget": self.budget.as_dict() if self.budget else None,
+            "health": {data.name: data.aatrea.health.as_dict() for data in self.units},
+        }
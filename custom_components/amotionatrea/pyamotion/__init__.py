@@ -0,0 +1,29 @@
+""" Async client for aMotion (Atrea) ventilation units
+
+Talks to the unit over its local websocket API and does not depend on
+Home Assistant. Put this directory's parent on the path to use it on its
+own, e.g. ``PYTHONPATH=custom_components/amotionatrea python -m pyamotion``.
+"""
+
+from .client import AtreaClient
+from .exceptions import (
+    AtreaConnectionError,
+    AtreaError,
+    AtreaRequestError,
+    AtreaUnauthorized,
+)
+from .exporter import OpenMetricsExporter
+from .fleet import RequestBudget
+from .status import STATUS_FIELDS, AtreaStatus
+
+__all__ = [
+    "AtreaClient",
+    "AtreaConnectionError",
+    "AtreaError",
+    "AtreaRequestError",
+    "AtreaStatus",
+    "AtreaUnauthorized",
+    "OpenMetricsExporter",
+    "RequestBudget",
+    "STATUS_FIELDS",
+]
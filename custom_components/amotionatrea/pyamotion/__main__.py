@@ -0,0 +1,196 @@
+""" Query, control and watch aMotion units from the command line
+
+    python -m pyamotion status ws://192.168.1.100/ ws://192.168.1.101/
+    python -m pyamotion set ws://192.168.1.100/ --temperature 21 --fan 40
+    python -m pyamotion watch ws://192.168.1.100/ ws://192.168.1.101/
+    python -m pyamotion export --port 9120 ws://192.168.1.100/ ws://192.168.1.101/
+
+Credentials come from --username/--password, or the AMOTION_USERNAME and
+AMOTION_PASSWORD environment variables. Output is JSON lines: one per unit,
+and with `watch` one per ui_info event. `export` serves the units to
+Prometheus on /metrics instead. The units are handled concurrently.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from functools import partial
+
+from .client import AtreaClient
+from .const import FLEET_MAX_REQUESTS, REQUEST_TIMEOUT
+from .exporter import WORK_REGIMES, OpenMetricsExporter
+from .fleet import RequestBudget
+
+LOGGER = logging.getLogger(__name__)
+
+# Poll cycles of the exporter between two maintenance reads
+MAINTENANCE_EVERY = 30
+
+
+def emit(record):
+    print(json.dumps(record, default=str), flush=True)
+
+
+def describe(client):
+    return {
+        "unit": client.url,
+        "name": client.name,
+        "model": client.model,
+        "sw_version": client.sw_version,
+        "status": client.status.as_dict(),
+    }
+
+
+async def status(client, args):
+    """Read every refresh tier once."""
+    async with asyncio.timeout(args.timeout):
+        await client.fetch()
+        await asyncio.gather(client.fetch_diagram(), client.fetch_maintenance())
+    emit(describe(client))
+
+
+async def control(client, args):
+    """Write the given control variables, they go out as one write."""
+    commands = []
+    if args.temperature is not None:
+        commands.append(client.set_temperature(args.temperature))
+    if args.fan is not None:
+        commands.append(client.set_fan_mode(args.fan))
+    if args.regime is not None:
+        commands.append(client.set_work_regime(args.regime))
+    async with asyncio.timeout(args.timeout):
+        # the fan scale depends on the control scheme read at login
+        await client.fetch()
+        await asyncio.gather(*commands)
+    emit(describe(client))
+
+
+async def watch(client, args):
+    """Print the status with every ui_info event until interrupted."""
+
+    def on_status(immediate=False):
+        emit({
+            "unit": client.url,
+            "time": datetime.now().isoformat(),
+            "changed": sorted(client.status.changed),
+            "status": client.status.as_dict(),
+        })
+
+    async with asyncio.timeout(args.timeout):
+        await client.fetch()
+    emit(describe(client))
+    client.set_status_listener(on_status)
+    await asyncio.Event().wait()
+
+
+async def export(exporter, client, args):
+    """Keep the status of the unit fresh for the exporter until interrupted.
+
+    The live status is also pushed by the unit, polling reads the tiers
+    which are not pushed and notices a dead unit.
+    """
+    exporter.add(client)
+    cycle = 0
+    while True:
+        requests = [client.fetch(), client.fetch_diagram()]
+        if cycle % MAINTENANCE_EVERY == 0:
+            requests.append(client.fetch_maintenance())
+        try:
+            async with asyncio.timeout(args.timeout):
+                await asyncio.gather(*requests)
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.warning("Polling %s failed: %s", client.url, str(err) or type(err).__name__)
+        cycle += 1
+        await asyncio.sleep(args.interval)
+
+
+async def run_unit(url, args, budget, command):
+    try:
+        async with AtreaClient(
+            url,
+            args.username,
+            args.password,
+            collect_metrics=args.command is export,
+            rate_limit=args.rate_limit,
+            shared_limit=budget,
+        ) as client:
+            await command(client, args)
+    except Exception as err:  # pylint: disable=broad-except
+        emit({"unit": url, "error": str(err) or type(err).__name__})
+        return False
+    return True
+
+
+async def run(args):
+    urls = [url if url.endswith("/") else url + "/" for url in args.urls]
+    budget = RequestBudget(FLEET_MAX_REQUESTS) if len(urls) > 1 else None
+    if args.command is not export:
+        results = await asyncio.gather(*(run_unit(url, args, budget, args.command) for url in urls))
+        return all(results)
+    exporter = OpenMetricsExporter()
+    async with await exporter.start_server(args.host, args.port):
+        command = partial(export, exporter)
+        results = await asyncio.gather(*(run_unit(url, args, budget, command) for url in urls))
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m pyamotion",
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument("--username", default=os.environ.get("AMOTION_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.environ.get("AMOTION_PASSWORD"))
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help="seconds to wait for a unit to answer")
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="requests per second per unit, 0 disables the limit")
+    parser.add_argument("--debug", action="store_true", help="log the traffic to stderr")
+    commands = parser.add_subparsers(required=True, metavar="COMMAND")
+
+    command = commands.add_parser("status", help="print the status of the units")
+    command.set_defaults(command=status)
+    command.add_argument("urls", nargs="+", metavar="URL")
+
+    command = commands.add_parser("set", help="change the settings of the units")
+    command.set_defaults(command=control)
+    command.add_argument("urls", nargs="+", metavar="URL")
+    command.add_argument("--temperature", type=float, help="requested temperature")
+    command.add_argument("--fan", type=int, help="fan power in percent")
+    command.add_argument("--regime", choices=WORK_REGIMES, help="work regime")
+
+    command = commands.add_parser("watch", help="stream the status pushed by the units")
+    command.set_defaults(command=watch)
+    command.add_argument("urls", nargs="+", metavar="URL")
+
+    command = commands.add_parser("export", help="serve the units in OpenMetrics format")
+    command.set_defaults(command=export)
+    command.add_argument("urls", nargs="+", metavar="URL")
+    command.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    command.add_argument("--port", type=int, default=9120, help="port to listen on")
+    command.add_argument("--interval", type=float, default=30, help="seconds between polls of a unit")
+
+    args = parser.parse_args()
+    if args.command is control and (args.temperature, args.fan, args.regime) == (None, None, None):
+        parser.error("set needs at least one of --temperature, --fan or --regime")
+    if args.password is None:
+        parser.error("pass --password or set AMOTION_PASSWORD")
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.DEBUG if args.debug else logging.WARNING,
+    )
+    try:
+        ok = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+""" Recording websocket sessions to JSON lines files and playing them back
+
+Every line of a capture is one frame:
+
+    {"t": 12.3456, "d": "in", "f": "<frame text>"}
+
+`t` is seconds since the recording started and `d` the direction, "in" for
+frames from the unit. Login credentials and the session token are redacted
+while recording.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+from .const import CAPTURE_MAX_SIZE
+from .trace import REDACTED, REDACTED_REPLIES, redact
+from .websocket import AtreaWebsocket
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CaptureWriter:
+    """Appends frames to a capture file from a writer thread.
+
+    `record()` only puts the frame on a queue, the file is opened, written
+    and flushed by the thread so the event loop never blocks on disk. Once
+    the file holds `max_size` bytes, further frames are dropped.
+    """
+
+    def __init__(self, path, max_size=CAPTURE_MAX_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.full = False
+        self._started = time.monotonic()
+        self._queue = queue.SimpleQueue()
+        # ids of requests whose replies have to be redacted
+        self._secret_ids = set()
+        self._thread = threading.Thread(
+            target=self._write, name="amotionatrea-capture", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, direction, frame, message_id=None, endpoint=None) -> None:
+        if self.full:
+            return
+        if direction == "out" and endpoint in REDACTED_REPLIES:
+            self._secret_ids.add(message_id)
+            frame = _redacted_frame(frame, False)
+        elif direction == "in" and message_id in self._secret_ids:
+            self._secret_ids.discard(message_id)
+            frame = _redacted_frame(frame, True)
+        if isinstance(frame, bytes):
+            frame = frame.decode(errors="replace")
+        self._queue.put((round(time.monotonic() - self._started, 4), direction, frame))
+
+    def close(self) -> None:
+        """Flush what is queued and close the file."""
+        self._queue.put(None)
+
+    def _write(self):
+        try:
+            with open(self.path, "a", encoding="utf-8") as capture:
+                size = capture.tell()
+                while (item := self._queue.get()) is not None:
+                    if self.full:
+                        continue
+                    timestamp, direction, frame = item
+                    line = json.dumps({"t": timestamp, "d": direction, "f": frame}) + "\n"
+                    size += len(line)
+                    if size > self.max_size:
+                        self.full = True
+                        capture.flush()
+                        LOGGER.warning(
+                            "Capture %s reached %d bytes, recording stopped",
+                            self.path, self.max_size,
+                        )
+                        continue
+                    capture.write(line)
+                    if self._queue.empty():
+                        capture.flush()
+        except OSError as err:
+            LOGGER.error("Cannot write capture %s: %s", self.path, err)
+
+
+def _redacted_frame(frame, reply):
+    try:
+        message = json.loads(frame)
+    except ValueError:
+        return frame
+    if reply and isinstance(message, dict) and message.get("response") is not None:
+        message["response"] = REDACTED
+    return json.dumps(redact(message), separators=(",", ":"))
+
+
+def read_capture(path):
+    """(time, direction, frame) of every frame in a capture file."""
+    with open(path, encoding="utf-8") as capture:
+        for line in capture:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry["t"], entry["d"], entry["f"]
+
+
+class ReplayTransport(AtreaWebsocket):
+    """Plays a capture back in place of the connection to a unit.
+
+    Requests are answered with the replies recorded for the same endpoint,
+    in recorded order, so login and the static requests work as with the
+    real unit. Pushed events are fed to the receiver with their recorded
+    spacing divided by `speed`, a speed of 0 replays them as fast as
+    possible. `finished` is set once every event was delivered.
+    """
+
+    def __init__(self, frames, speed=1.0, **kwargs) -> None:
+        super().__init__("replay://", **kwargs)
+        self._speed = speed
+        self._events = []
+        self._replies = defaultdict(deque)
+        endpoints = {}
+        for timestamp, direction, frame in frames:
+            try:
+                message = self._codec.loads(frame)
+            except self._codec.errors:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if direction == "out":
+                endpoints[message.get("id")] = message.get("endpoint")
+            elif message.get("type") == "event":
+                self._events.append((timestamp, frame))
+            elif message.get("id") in endpoints:
+                self._replies[endpoints.pop(message["id"])].append(message)
+        self._on_data = None
+        self._deliveries = set()
+        self.finished = asyncio.Event()
+
+    @classmethod
+    def from_file(cls, path, speed=1.0, **kwargs) -> "ReplayTransport":
+        return cls(read_capture(path), speed, **kwargs)
+
+    @property
+    def events(self):
+        return len(self._events)
+
+    async def send(self, message, login=False, on_drop=None, urgent=False):
+        replies = self._replies.get(message["endpoint"])
+        if not replies:
+            LOGGER.debug("No recorded reply to %s", message["endpoint"])
+            return
+        # keep the last reply to answer repeated polls
+        reply = dict(replies.popleft() if len(replies) > 1 else replies[0])
+        reply["id"] = message["id"]
+        # answer after the caller registered its reply slot, like the network
+        task = asyncio.create_task(self._deliver(self._codec.dumps(reply)))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, frame):
+        decoded = self._codec.loads(frame)
+        if self.trace is not None:
+            self.trace.inbound(frame, decoded)
+        await self._on_data(decoded)
+
+    async def connect(self, on_connect, on_data, on_close):
+        self._on_data = on_data
+        self.connections += 1
+        if on_connect:
+            await on_connect()
+        await self._ready.wait()
+        start = time.monotonic()
+        first = self._events[0][0] if self._events else 0.0
+        for timestamp, frame in self._events:
+            if self._speed:
+                delay = (timestamp - first) / self._speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self._last_message = time.monotonic()
+            await self._deliver(frame)
+        self.finished.set()
+        await asyncio.Event().wait()
@@ -0,0 +1,718 @@
+""" Client talking to one aMotion unit over its websocket API """
+
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from .capture import CaptureWriter
+from .const import (
+    CONTROL_DELAY,
+    CONTROL_ENDPOINTS,
+    CONTROL_MAX_DELAY,
+    DEFAULT_KEEPALIVE_INTERVAL,
+    DEFAULT_RATE_LIMIT,
+    HISTORY_METRICS,
+    KEEPALIVE_TIMEOUT,
+    LIVE_ENDPOINTS,
+    LOGIN_ENDPOINTS,
+    PENDING_MAX_SIZE,
+    PENDING_TTL,
+    POLL_ENDPOINTS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_LATENCY,
+    REQUEST_LIMITS,
+    REQUEST_TIMEOUT,
+    SEND_QUEUE_SIZE,
+    TRACE_SIZE,
+)
+from .control import ControlCoalescer
+from .derived import HeatRecovery
+from .exceptions import AtreaConnectionError, AtreaError, AtreaRequestError, AtreaUnauthorized
+from .fleet import RequestBudget, UnitHealth
+from .metrics import ProtocolMetrics
+from .pending import PendingRequests
+from .ratelimit import RateLimiter
+from .scheduler import BACKGROUND, CONTROL, LIVE, RequestScheduler
+from .status import AtreaStatus
+from .timeseries import TelemetryHistory
+from .trace import TrafficTrace, redact
+from .websocket import AtreaWebsocket
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _create_task(coro, name):
+    return asyncio.get_running_loop().create_task(coro, name=name)
+
+
+class AtreaClient:
+    """Keep the unit state in one place and centralize websocket use.
+
+    The client connects as soon as it is created, within a running event
+    loop. Its background tasks are started with `create_task(coro, name)`,
+    which defaults to the running loop's `create_task()`. Use it as an
+    async context manager, or call `close()`, to stop them again. `cache`
+    is what `export_cache()` returned on a previous run.
+    """
+
+    async def on_close(self) -> None:
+        LOGGER.debug("Failing %d pending requests", len(self._pending))
+        self.logged_in = False
+        # Nobody will answer the outstanding requests on this connection,
+        # fail them now instead of letting them run into the timeout.
+        self._pending.fail_all(ConnectionError("Websocket closed"))
+
+    async def on_connect(self):
+        LOGGER.debug("Connected")
+        self._spawn(self.login(), "amotionatrea-login")
+
+    async def receive(self, message):
+        """ Sample responses we get:
+        {'args': {'active': False, 'countdown': 0, 'finish': {'day': 0, 'hour': 0, 'minute': 0, 'month': 0, 'year': 0}, 'sceneId': 0, 'start': {'day': 0, 'hour': 0, 'minute': 0, 'month': 0, 'year': 0}}, 'event': 'disposable_plan', 'type': 'event'} #pylint: disable=line-too-long
+        {'code': 'OK', 'error': None, 'id': None, 'response': {'ui_diagram_data': {'bypass_estim': 100, 'damper_io_state': True, 'fan_eta_operating_time': 24, 'fan_sup_operating_time': 24, 'preheater_active': False, 'preheater_factor': 0, 'preheater_type': 'ELECTRO_PWM'}}, 'type': 'response'} #pylint: disable=line-too-long
+        {'code': 'OK', 'error': None, 'id': 4, 'response': {'requests': {'fan_power_req': 60, 'temp_request': 22.0, 'work_regime': 'VENTILATION'}, 'states': {'active': {}}, 'unit': {'fan_eta_factor': 60, 'fan_sup_factor': 60, 'mode_current': 'NORMAL', 'season_current': 'NON_HEATING', 'temp_eha': 23.0, 'temp_eta': 23.0, 'temp_ida': 23.0, 'temp_oda': 16.2, 'temp_oda_mean': 16.275, 'temp_sup': 17.5}}, 'type': 'response'} #pylint: disable=line-too-long
+        {'args': {'requests': {'fan_power_req': 30, 'temp_request': 18.5, 'work_regime': 'VENTILATION'}, 'states': {'active': {}}, 'unit': {'fan_eta_factor': 30, 'fan_sup_factor': 30, 'mode_current': 'NORMAL', 'season_current': 'NON_HEATING', 'temp_eha': 23.9, 'temp_eta': 23.9, 'temp_ida': 23.9, 'temp_oda': 22.9, 'temp_oda_mean': 22.25, 'temp_sup': 23.3}}, 'event': 'ui_info', 'type': 'event'} #pylint: disable=line-too-long
+        {"code":"UNAUTHORIZED","error":"Unauthorized: No authorized user (or missing token)","id":9,"response":null,"type":"response"} #pylint: disable=line-too-long
+        """
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("receive message: %s", redact(message))
+        if 'id' in message and message['id']:
+            if message['code'] == 'UNAUTHORIZED':
+                # Fail only the request, the connection is fine and a
+                # rejected session token falls back to a credential login.
+                LOGGER.debug("Request %s unauthorized", message['id'])
+                self._pending.reject(message['id'], AtreaUnauthorized())
+                return
+            if message['code'] != 'OK':
+                LOGGER.debug("Request %s failed: %s", message['id'], message['code'])
+                self._pending.reject(
+                    message['id'], AtreaRequestError(message['code'], message.get('error'))
+                )
+                return
+            self._pending.resolve(message['id'], message['response'])
+        elif message['type'] == 'event' and message['event'] == 'ui_info' and self.logged_in:
+            await self._update_status(message)
+            self._notify_status()
+
+    def export_cache(self) -> dict:
+        """What is needed to set the unit up again without talking to it."""
+        return {
+            'device': {
+                'model': self.model,
+                'serial': self.serial,
+                'brand': self.brand,
+                'name': self.name,
+                'sw_version': self.sw_version,
+            },
+            'scheme': {
+                'max_flow': self._max_flow,
+                'min_flow': self._min_flow,
+            },
+            'has_uv_lamp': self.has_uv_lamp,
+            'token': self._token,
+            'status': self.status.as_dict(),
+        }
+
+    def restore_cache(self, cache: dict) -> None:
+        """Apply what `export_cache()` returned on a previous run."""
+        device = cache.get('device', {})
+        self.model = device.get('model', self.model)
+        self.serial = device.get('serial', self.serial)
+        self.brand = device.get('brand', self.brand)
+        self.name = device.get('name', self.name)
+        self.sw_version = device.get('sw_version', self.sw_version)
+        scheme = cache.get('scheme', {})
+        self._max_flow = scheme.get('max_flow')
+        self._min_flow = scheme.get('min_flow')
+        self.has_uv_lamp = cache.get('has_uv_lamp', False)
+        self._token = cache.get('token')
+        self._static_known = self.sw_version is not None
+        self.status = AtreaStatus.from_dict(cache.get('status', {}))
+        self._heat_recovery = HeatRecovery(self.status.recovered_energy)
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    @property
+    def has_flow(self) -> bool:
+        """Whether the control scheme sets air flow, only then the unit
+        reports flows and the recovered heat can be derived."""
+        return bool(self._max_flow)
+
+    @property
+    def logged_in(self) -> bool:
+        return self._logged_in.is_set()
+
+    @logged_in.setter
+    def logged_in(self, value: bool) -> None:
+        if value:
+            self._logged_in.set()
+        else:
+            self._logged_in.clear()
+
+    @property
+    def link_rtt(self):
+        """Keepalive round trip time in milliseconds."""
+        rtt = self._websocket.rtt
+        return None if rtt is None else round(rtt * 1000, 1)
+
+    @property
+    def reconnects(self):
+        return self._websocket.reconnects
+
+    @property
+    def request_queue_depth(self):
+        """Requests waiting for the scheduler, the rate limiter or the socket."""
+        depth = sum(self.scheduler.waiting.values()) + self._websocket.queue_depth
+        if self.rate_limiter is not None:
+            depth += self.rate_limiter.queue_depth
+        return depth
+
+    def connection_info(self) -> dict:
+        """Queue, pending request and link counters for diagnostics."""
+        return {
+            'logged_in': self.logged_in,
+            'link_rtt_ms': self.link_rtt,
+            'connections': self._websocket.connections,
+            'dead_links': self._websocket.dead_links,
+            'last_message_age': self.last_message_age,
+            'queue_depth': self._websocket.queue_depth,
+            'dropped': self._websocket.dropped,
+            'abandoned': self._websocket.abandoned,
+            'pending': len(self._pending),
+            'scheduler': {
+                'in_flight': self.scheduler.in_flight,
+                'waiting': self.scheduler.waiting,
+                'deferred': self.scheduler.deferred,
+                'dropped': self.scheduler.dropped,
+            },
+            'rate_limiter': self.rate_limiter.as_dict() if self.rate_limiter else None,
+            'orphaned': self._pending.orphaned,
+            'evicted': self._pending.evicted,
+        }
+
+    @property
+    def last_message_age(self):
+        """Seconds since the unit last sent anything."""
+        age = self._websocket.last_message_age
+        return None if age is None else round(age)
+
+    def start_recording(self, path) -> None:
+        """Append every frame of the session to a capture file, until it
+        holds CAPTURE_MAX_SIZE bytes."""
+        self.stop_recording()
+        LOGGER.info("Recording websocket traffic to %s", path)
+        self._websocket.recorder = CaptureWriter(path)
+
+    def stop_recording(self) -> None:
+        if self._websocket.recorder is not None:
+            self._websocket.recorder.close()
+            self._websocket.recorder = None
+
+    def set_status_listener(self, listener):
+        """Register a callback run after each pushed status update.
+
+        It gets `immediate=True` for updates which should not wait for the
+        push interval.
+        """
+        self._status_listener = listener
+
+    def _notify_status(self, immediate=False):
+        if self._status_listener:
+            self._status_listener(immediate)
+
+    async def _update_status(self, message):
+        unit = message['args']['unit']
+        requests = message['args']['requests']
+        values = {
+            'current_temperature': unit['temp_sup'],
+            'setpoint': requests['temp_request'],
+            'temp_oda': unit['temp_oda'],
+            'temp_ida': unit['temp_ida'],
+            'temp_eha': unit['temp_eha'],
+            'temp_eta': unit['temp_eta'],
+            'temp_sup': unit['temp_sup'],
+            'season_current': unit['season_current'],
+            'work_regime': requests.get('work_regime'),
+            'last_update': datetime.now(),
+        }
+
+        if self._max_flow:
+            values['fan_mode'] = round(
+                float(requests['flow_ventilation_req']) /
+                (float(self._max_flow) / 100), -1
+            )
+            values['fan_eta_factor'] = round(
+                float(unit['flow_eta']) /
+                (float(self._max_flow) / 100), -1
+            )
+            values['fan_sup_factor'] = round(
+                float(unit['flow_sup']) /
+                (float(self._max_flow) / 100), -1
+            )
+        else:
+            values['fan_eta_factor'] = unit['fan_eta_factor']
+            values['fan_sup_factor'] = unit['fan_sup_factor']
+            values['fan_mode'] = requests['fan_power_req']
+        values.update(self._heat_recovery.update(
+            unit['temp_oda'],
+            unit['temp_sup'],
+            unit['temp_eta'],
+            unit['temp_eha'],
+            unit.get('flow_sup') if self._max_flow else None,
+            time.monotonic(),
+        ))
+        if self._optimistic:
+            self._reconcile(values)
+        self.status = self.status.update(**values)
+        self.history.record(values, time.monotonic())
+
+    async def update(self, message_id=None, timeout=REQUEST_TIMEOUT, strict=False):
+        """Wait for the reply to a request.
+
+        A missing or failed reply returns None, or raises with `strict`.
+        """
+        if message_id:
+            future = self._pending.get(message_id)
+            if future is None:
+                LOGGER.debug("No pending request for message_id: %s", message_id)
+                if self.metrics is not None:
+                    self.metrics.finish(message_id, "error")
+                return None
+            outcome = "error"
+            try:
+                async with asyncio.timeout(timeout):
+                    msg = await future
+                outcome = "ok"
+                return msg
+            except asyncio.TimeoutError:
+                LOGGER.debug("Timeout while waiting for message_id: %s", message_id)
+                outcome = "timeout"
+                if strict:
+                    raise
+            except ConnectionError as err:
+                LOGGER.debug("Lost reply for message_id %s: %s", message_id, err)
+                if strict:
+                    raise
+            except AtreaRequestError:
+                if strict:
+                    raise
+            finally:
+                self._pending.discard(message_id)
+                if self.metrics is not None:
+                    self.metrics.finish(message_id, outcome)
+
+    async def fetch(self):
+        requests = []
+        if self._max_flow:
+            requests.append(self.time())
+
+        if self.status.current_temperature is None or self.status.last_update is None or (
+            datetime.now() - self.status.last_update >= timedelta(minutes=2)
+        ):
+            try:
+                async with asyncio.timeout(60):
+                    await self._logged_in.wait()
+            except asyncio.TimeoutError:
+                LOGGER.debug("Timeout while waiting for login")
+            requests.append(self.async_get_ui_info())
+
+        await self._gather(*requests)
+        return self.status
+
+    async def fetch_diagram(self):
+        await self.async_get_diagram_data()
+        return self.status
+
+    async def fetch_maintenance(self):
+        await self.async_get_maintenance_data()
+        return self.status
+
+    async def _gather(self, *requests):
+        """Run independent requests concurrently over the one websocket.
+
+        A failing request is logged and does not stop the others, only when
+        all of them fail the first error is raised.
+        """
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            LOGGER.debug("Request failed: %r", error)
+        if errors and len(errors) == len(results):
+            raise errors[0]
+
+    async def async_get_ui_info(self):
+        message = await self.request("ui_info")
+        if message:
+            # mingle the message to use single function to update status
+            message["args"] = message
+            await self._update_status(message)
+
+    async def send(self, endpoint, args=None):
+        """Queue a request for the unit and return its message id."""
+        # Register the reply slot before sending so a fast reply cannot race us.
+        message_id, _ = self._pending.create()
+        msg = {'endpoint': endpoint, 'args': args, 'id': message_id}
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("Sending %s", redact(msg))
+        if self.metrics is not None:
+            self.metrics.start(message_id, endpoint)
+
+        on_drop = None
+        if endpoint in POLL_ENDPOINTS:
+            on_drop = partial(
+                self._pending.reject, message_id, ConnectionError("Dropped stale poll")
+            )
+        try:
+            await self._websocket.send(
+                msg,
+                login=endpoint in LOGIN_ENDPOINTS,
+                on_drop=on_drop,
+                urgent=endpoint in CONTROL_ENDPOINTS,
+            )
+        except AtreaConnectionError:
+            LOGGER.debug("Cannot queue message to %s", self._url)
+            self._pending.discard(message_id)
+            if self.metrics is not None:
+                self.metrics.finish(message_id, "error")
+            raise
+
+        return message_id
+
+    async def request(self, endpoint, args=None, timeout=REQUEST_TIMEOUT, strict=False):
+        """Send a request and wait for its response.
+
+        Apart from login, requests wait for a slot of their priority class
+        first, polls already waiting for one are dropped. Then they wait
+        for the rate limiter, and only then for a slot of the fleet budget.
+        """
+        if endpoint in LOGIN_ENDPOINTS:
+            return await self.update(await self.send(endpoint, args), timeout, strict)
+        if endpoint in CONTROL_ENDPOINTS:
+            priority = CONTROL
+        elif endpoint in LIVE_ENDPOINTS:
+            priority = LIVE
+        else:
+            priority = BACKGROUND
+        key = endpoint if endpoint in POLL_ENDPOINTS else None
+        async with self.scheduler.slot(priority, key):
+            if self.rate_limiter is None:
+                async with self._fleet_slot(priority):
+                    return await self.update(await self.send(endpoint, args), timeout, strict)
+            # a throttled unit waits for its token before it takes a slot
+            # of the fleet budget, not while holding one
+            await self.rate_limiter.acquire(priority)
+            async with self._fleet_slot(priority):
+                start = time.monotonic()
+                try:
+                    return await self.update(await self.send(endpoint, args), timeout, strict)
+                finally:
+                    self.rate_limiter.observe(time.monotonic() - start)
+
+    def _fleet_slot(self, priority):
+        """Slot of the request budget shared by a fleet.
+
+        Requests of a unit which is not logged in only wait for the
+        connection, they do not take a slot from the other units.
+        """
+        if self._fleet_share is None or not self.logged_in:
+            return contextlib.nullcontext()
+        return self._fleet_share.slot(priority == CONTROL)
+
+    async def async_get_discovery(self):
+        discovery_data = await self.request("discovery")
+        # Sample data:
+        # {'activation_status': 'READY', 'addresses': {'eth0': ['172.20.20.20', '192.168.0.11']}, 'board_number': '0c:2g:b3:0d:11:0a', 'board_type': 'CL', 'brand': 'atrea.cz', 'cloud': {'enable': False, 'link': 'https://amotion.cloud', 'support': True}, 'commissioned': False, 'initialized': True, 'localisation': 'cs', 'name': 'DUPLEX 380 ECV5.aM-CL', 'port': 80, 'production_number': 'FFFFFFF', 'service_name': '', 'type': 'DUPLEX 380 ECV5.aM-CL', 'version': 'ATC-v2.3.0'} #pylint: disable=line-too-long
+        if discovery_data:
+            self.model = discovery_data.get('type', 'Unknown')
+            self.serial = discovery_data.get('production_number', 'Unknown')
+            self.brand = discovery_data.get('brand', 'Atrea')
+            self.name = discovery_data.get('name', 'Atrea')
+
+    async def async_get_version(self):
+        version_data = await self.request("version")
+        if version_data:
+            if 'GATEWAY' in version_data and 'version' in version_data['GATEWAY']:
+                self.sw_version = version_data['GATEWAY']['version']
+            else:
+                self.sw_version = 'unknown'
+
+    async def login(self):
+        """Log in, reusing the session token and static data when we can.
+
+        Only an OK reply logs in. When the unit rejects the credentials or
+        does not answer, the connection stays logged out.
+        """
+        try:
+            await self._login()
+        except (AtreaError, ConnectionError, asyncio.TimeoutError) as err:
+            LOGGER.warning("Login to %s failed: %s", self._url, str(err) or type(err).__name__)
+
+    async def _login(self):
+        if not (self._token and await self._login_with_token(self._token)):
+            LOGGER.debug("Sending login to get token")
+            token = await self.request(
+                "login", {"username": self._username, "password": self._password}, strict=True
+            )
+            if not token:
+                raise AtreaUnauthorized("No session token in the login reply")
+            self._token = token
+            await self.request("login", {"token": token}, strict=True)
+
+        if not self._static_known:
+            await self.ui_scheme()
+        self.logged_in = True
+        self._websocket.set_ready()
+
+        if self._static_known:
+            # The control scheme and device info only change with firmware
+            sw_version = self.sw_version
+            await self.async_get_version()
+            if self.sw_version != sw_version:
+                LOGGER.debug("Firmware changed to %s", self.sw_version)
+                await self._gather(self.ui_scheme(), self.async_get_discovery())
+        else:
+            await self._gather(self.async_get_discovery(), self.async_get_version())
+            self._static_known = True
+
+    async def _login_with_token(self, token):
+        """Log in with a cached token, False to fall back to credentials."""
+        try:
+            await self.request("login", {"token": token}, strict=True)
+        except AtreaUnauthorized:
+            LOGGER.debug("Session token rejected")
+            self._token = None
+            return False
+        except (AtreaError, ConnectionError, asyncio.TimeoutError) as err:
+            LOGGER.debug("Login with the session token failed: %r", err)
+            return False
+        return True
+
+    async def ui_scheme(self):
+        control_scheme = await self.request("ui_control_scheme")
+        if 'flow_ventilation_req' in control_scheme['requests']:
+            self._max_flow = control_scheme['types']['flow_ventilation_req']['max']
+            self._min_flow = control_scheme['types']['flow_ventilation_req']['min']
+
+    async def async_get_diagram_data(self):
+        """Fetch diagram data including bypass_estim from the server."""
+        diagram_response = await self.request("ui_diagram_data")
+        if diagram_response:
+            # The server returns `ui_diagram_data` as a nested key in the response
+            ui_diagram = diagram_response.get('ui_diagram_data', {})
+            values = {
+                'bypass_estim': ui_diagram.get('bypass_estim', 0),
+                'preheater_factor': ui_diagram.get('preheater_factor', 0),
+            }
+            self.status = self.status.update(**values)
+            self.history.record(values, time.monotonic())
+
+    async def async_get_maintenance_data(self):
+        """ Get maintenance information like filter change dates and motor hours """
+        # strict, the tier fails instead of reading a missing reply
+        moment_data = await self.request("moments/get", strict=True)
+        self.status = self.status.update(last_maintenance_update=datetime.now())
+        values = {
+            'filters_last_change': moment_data.get('lastFilterReset', {}),
+            'inspection_date': moment_data.get('inspection', {}),
+            'motor1_hours': round(moment_data['m1_register'] / 3600),
+            'motor2_hours': round(moment_data['m2_register'] / 3600),
+        }
+        # UV lamp operating hours
+        if 'uv_lamp_register' in moment_data and moment_data['uv_lamp_register'] > 0:
+            values['uv_lamp_hours'] = round(moment_data['uv_lamp_register'] / 3600)
+            self.has_uv_lamp = True
+        else:
+            values['uv_lamp_hours'] = None
+            self.has_uv_lamp = False
+        self.status = self.status.update(**values)
+
+    async def time(self):
+        message = await self.request("time")
+        LOGGER.debug("TIME %s", message)
+
+    async def ws_connect(self) -> None:
+        """Connect the websocket."""
+        if self._start_delay:
+            await asyncio.sleep(self._start_delay)
+        await self._websocket.connect(self.on_connect, self.receive, self.on_close)
+
+    async def set_fan_mode(self, fan_mode):
+        if self._max_flow:
+            flow_request = (float(self._max_flow) / 100) * int(fan_mode)
+            flow_request = max(flow_request, self._min_flow)
+            variables = {"flow_ventilation_req": int(flow_request)}
+        else:
+            variables = {"fan_power_req": int(fan_mode)}
+        await self._command(variables, {'fan_mode': float(int(fan_mode))})
+
+    async def set_temperature(self, temperature):
+        await self._command(
+            {'temp_request': int(temperature)}, {'setpoint': float(int(temperature))}
+        )
+
+    async def set_work_regime(self, work_regime):
+        """Switch the unit to 'OFF', 'AUTO' or 'VENTILATION'."""
+        await self._command({"work_regime": work_regime}, {'work_regime': work_regime})
+
+    async def _write_control(self, variables):
+        return await self.request("control", {'variables': variables}, strict=True)
+
+    async def _command(self, variables, optimistic):
+        """Show `optimistic` status values at once, then write the variables.
+
+        The values stay pending until a ui_info reports them, or reports
+        anything after the unit accepted the command. A failed write rolls
+        them back to what the unit reported last.
+        """
+        for name, value in optimistic.items():
+            entry = self._optimistic.get(name)
+            reported = entry[2] if entry else getattr(self.status, name)
+            self._optimistic[name] = [value, False, reported]
+        self.status = self.status.update(**optimistic)
+        self._notify_status(immediate=True)
+        try:
+            # polling waits until the burst was written
+            async with self.scheduler.burst():
+                await self._control.submit(variables)
+        except Exception:
+            self._settle(optimistic, accepted=False)
+            raise
+        self._settle(optimistic, accepted=True)
+
+    def _settle(self, optimistic, accepted):
+        rollback = {}
+        for name, value in optimistic.items():
+            entry = self._optimistic.get(name)
+            if entry is None or entry[0] != value:
+                # reconciled already, or superseded by a newer command
+                continue
+            if accepted:
+                entry[1] = True
+            else:
+                del self._optimistic[name]
+                rollback[name] = entry[2]
+        if rollback:
+            LOGGER.debug("Command failed, rolling back %s", rollback)
+            self.status = self.status.update(**rollback)
+            self._notify_status(immediate=True)
+
+    def _reconcile(self, values):
+        """Keep pending optimistic values over reports which predate them."""
+        for name, entry in list(self._optimistic.items()):
+            if name not in values:
+                continue
+            value, accepted, _ = entry
+            if accepted or values[name] == value:
+                del self._optimistic[name]
+            else:
+                entry[2] = values[name]
+                values[name] = value
+
+    @property
+    def pending_fields(self) -> frozenset[str]:
+        """Status fields showing a value the unit did not confirm yet."""
+        return frozenset(self._optimistic)
+
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        keepalive_interval: int = DEFAULT_KEEPALIVE_INTERVAL,
+        collect_metrics: bool = False,
+        transport: AtreaWebsocket | None = None,
+        request_limits: tuple[int, int, int] = REQUEST_LIMITS,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        shared_limit: RequestBudget | None = None,
+        start_delay: float = 0.0,
+        create_task=_create_task,
+        cache: dict | None = None,
+    ) -> None:
+        self._create_task = create_task
+        self._tasks = set()
+        self._url = url
+        self._username = username
+        self._password = password
+
+        self._available = True
+        # set while the connection is logged in, fetch() waits for it
+        self._logged_in = asyncio.Event()
+        self._pending = PendingRequests(PENDING_MAX_SIZE, PENDING_TTL)
+        self._status_listener = None
+        # status field -> [requested value, accepted, last reported value]
+        self._optimistic = {}
+        self.scheduler = RequestScheduler(request_limits)
+        # request budget shared with the other units of a fleet
+        self._fleet_share = None if shared_limit is None else shared_limit.share()
+        self._start_delay = start_delay
+        self.health = UnitHealth()
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = RateLimiter(rate_limit, RATE_LIMIT_BURST, RATE_LIMIT_LATENCY)
+        self.metrics = ProtocolMetrics() if collect_metrics else None
+        self.trace = TrafficTrace(TRACE_SIZE)
+        if transport is None:
+            transport = AtreaWebsocket(
+                url,
+                SEND_QUEUE_SIZE,
+                keepalive_interval=keepalive_interval,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+        transport.metrics = self.metrics
+        transport.trace = self.trace
+        transport.pending = self._pending
+        self._websocket = transport
+        self._control = ControlCoalescer(
+            self._write_control,
+            lambda write: self._spawn(write, "amotionatrea-control"),
+            CONTROL_DELAY,
+            CONTROL_MAX_DELAY,
+        )
+        self._max_flow = None
+        self._min_flow = None
+        self.has_uv_lamp = False
+        self._token = None
+        # control scheme, discovery and version are loaded
+        self._static_known = False
+
+        self.status = AtreaStatus()
+        self.history = TelemetryHistory(HISTORY_METRICS)
+        self._heat_recovery = HeatRecovery()
+
+        self.model = None
+        self.sw_version = None
+        self.serial = None
+        self.brand = "Atrea"
+        self.name = "Atrea"
+        if cache:
+            # before connecting, so the first login can use it
+            self.restore_cache(cache)
+
+        self._spawn(self.ws_connect(), "amotionatrea-ws_connect")
+
+    def _spawn(self, coro, name):
+        task = self._create_task(coro, name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self) -> None:
+        """Stop the connection and every task the client started."""
+        self.stop_recording()
+        self._control.cancel()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.logged_in = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,64 @@
+""" JSON codec for websocket frames, using the fastest library available """
+
+import json
+from typing import Any, Callable, NamedTuple
+
+
+class Codec(NamedTuple):
+    name: str
+    dumps: Callable[[Any], str]
+    # accepts both str and bytes frames
+    loads: Callable[[str | bytes], Any]
+    errors: tuple[type[Exception], ...]
+
+
+def _stdlib():
+    return Codec(
+        "json",
+        lambda obj: json.dumps(obj, separators=(",", ":")),
+        json.loads,
+        (ValueError,),
+    )
+
+
+def _orjson():
+    import orjson
+
+    return Codec(
+        "orjson",
+        lambda obj: orjson.dumps(obj).decode(),
+        orjson.loads,
+        (orjson.JSONDecodeError,),
+    )
+
+
+def _msgspec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return Codec(
+        "msgspec",
+        lambda obj: encoder.encode(obj).decode(),
+        decoder.decode,
+        (msgspec.DecodeError,),
+    )
+
+
+CODECS = {
+    "orjson": _orjson,
+    "msgspec": _msgspec,
+    "json": _stdlib,
+}
+
+
+def get_codec(name: str | None = None) -> Codec:
+    """Return the named codec, or the first one whose library is installed."""
+    if name is not None:
+        return CODECS[name]()
+    for factory in CODECS.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    return _stdlib()
@@ -0,0 +1,62 @@
+""" Protocol constants of the aMotion websocket API """
+
+REQUEST_TIMEOUT = 30
+# Requests waiting for a reply, older or surplus ones are evicted
+PENDING_MAX_SIZE = 256
+PENDING_TTL = 2 * REQUEST_TIMEOUT
+# Outgoing messages waiting for the connection
+SEND_QUEUE_SIZE = 64
+# Sent before the connection is logged in
+LOGIN_ENDPOINTS = ("login", "ui_control_scheme")
+# Periodic reads which may be dropped when the send queue is full
+POLL_ENDPOINTS = ("time", "ui_info", "ui_diagram_data", "moments/get")
+# Sent ahead of everything else but login, and never held back
+CONTROL_ENDPOINTS = ("control",)
+LIVE_ENDPOINTS = ("ui_info",)
+# Requests in flight per priority class: control, live, background. Two
+# background requests let discovery and version at login, and the diagram
+# and maintenance tiers, go out together.
+REQUEST_LIMITS = (2, 2, 2)
+
+# Requests per second sent to one unit, 0 disables the limit
+DEFAULT_RATE_LIMIT = 5
+# Requests which may go out at once before the rate applies
+RATE_LIMIT_BURST = 10
+# Average reply latency [s] above which the rate is lowered
+RATE_LIMIT_LATENCY = 1.0
+
+# Status fields kept in the in-memory telemetry history
+HISTORY_METRICS = (
+    "temp_oda",
+    "temp_ida",
+    "temp_eha",
+    "temp_eta",
+    "temp_sup",
+    "fan_eta_factor",
+    "fan_sup_factor",
+    "bypass_estim",
+    "preheater_factor",
+)
+
+# Seconds between keepalive pings, 0 disables them
+DEFAULT_KEEPALIVE_INTERVAL = 20
+# Seconds without a pong before the link is considered dead
+KEEPALIVE_TIMEOUT = 10
+# Frames kept in the traffic trace
+TRACE_SIZE = 200
+# Bytes after which a traffic capture stops recording
+CAPTURE_MAX_SIZE = 20 * 1024 * 1024
+
+# Control variables set within CONTROL_DELAY seconds of each other are
+# written together. The first ones after a quiet period are written at once,
+# the ones which follow CONTROL_MAX_DELAY seconds later at the latest
+CONTROL_DELAY = 0.3
+CONTROL_MAX_DELAY = 1.0
+
+# Requests in flight across all units polled together
+FLEET_MAX_REQUESTS = 32
+# Of those, held by one unit at most, so a stalled unit cannot starve the
+# others while its requests time out. One is left to control writes.
+FLEET_UNIT_MAX_REQUESTS = 3
+# Seconds over which the connects of many units are spread
+FLEET_CONNECT_SPREAD = 10
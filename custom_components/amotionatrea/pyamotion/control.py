@@ -0,0 +1,110 @@
+""" Coalescing of control variables written in quick succession """
+
+import asyncio
+import logging
+from functools import partial
+
+from .exceptions import AtreaConnectionError
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ControlCoalescer:
+    """Merges control variables set within a short window into one write.
+
+    The first variables after a quiet period are sent at once. Variables
+    set within `delay` seconds of the previous ones are collected, every
+    `submit()` restarts the quiet period and the collected variables are
+    sent together when it ends or `max_delay` seconds after the first one,
+    whichever comes first, and not before the previous write finished. A
+    variable set twice is sent with its last value. All callers of a burst
+    get the result of the one write.
+    """
+
+    def __init__(self, send, create_task, delay=0.3, max_delay=1.0) -> None:
+        # coroutine function taking the variables dict
+        self._send = send
+        self._create_task = create_task
+        self._delay = delay
+        self._max_delay = max_delay
+        self._variables = {}
+        self._future = None
+        self._first = None
+        self._handle = None
+        self._last_submit = None
+        self._last_write = None
+        self.writes = 0
+        self.coalesced = 0
+
+    @property
+    def pending(self) -> dict:
+        """Variables waiting to be written."""
+        return dict(self._variables)
+
+    async def submit(self, variables: dict):
+        """Add variables to the current burst and wait until it was written."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        quiet = self._last_submit is None or now - self._last_submit >= self._delay
+        immediate = quiet and self._future is None
+        self._last_submit = now
+        if self._future is None:
+            self._future = loop.create_future()
+            self._first = now
+        else:
+            self.coalesced += 1
+        future = self._future
+        self._variables.update(variables)
+        if self._handle is not None:
+            self._handle.cancel()
+        if immediate:
+            self._flush()
+        else:
+            delay = min(self._delay, self._first + self._max_delay - now)
+            self._handle = loop.call_later(max(delay, 0.0), self._flush)
+        # a cancelled caller must not cancel the write of the others
+        return await asyncio.shield(future)
+
+    def cancel(self) -> None:
+        """Fail the burst which was not written yet."""
+        if self._handle is not None:
+            self._handle.cancel()
+        future = self._future
+        self._variables, self._future, self._first, self._handle = {}, None, None, None
+        if future is not None:
+            _fail(future, AtreaConnectionError("Control write cancelled"))
+
+    def _flush(self):
+        variables, future = self._variables, self._future
+        self._variables, self._future, self._first, self._handle = {}, None, None, None
+        task = self._create_task(self._write(variables, future, self._last_write))
+        # a write cancelled, e.g. by closing the client, maybe before it
+        # started, must not leave its callers waiting
+        task.add_done_callback(partial(_cancelled, future))
+        self._last_write = task
+
+    async def _write(self, variables, future, previous):
+        try:
+            if previous is not None:
+                # keep the writes in the order the variables were set
+                await asyncio.wait((previous,))
+            self.writes += 1
+            LOGGER.debug("Writing control variables %s", variables)
+            result = await self._send(variables)
+        except Exception as err:  # handed to the callers
+            _fail(future, err)
+        else:
+            future.set_result(result)
+
+
+def _cancelled(future, _task):
+    if not future.done():
+        _fail(future, AtreaConnectionError("Control write cancelled"))
+
+
+def _fail(future, err):
+    if future.done():
+        return
+    future.set_exception(err)
+    # mark it retrieved, every caller may have gone away
+    future.exception()
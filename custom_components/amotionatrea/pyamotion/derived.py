@@ -0,0 +1,82 @@
+""" Heat recovery figures derived from the four-point temperatures """
+
+import math
+
+# Air density [kg/m3] times specific heat [J/kg.K] over seconds per hour,
+# gives W per (m3/h . K)
+AIR_HEAT_FLOW = 1.2 * 1005 / 3600
+# Below this outdoor/extract difference the efficiency is mostly noise [K]
+MIN_DELTA = 3.0
+# Time constant of the efficiency and power filters [s]
+FILTER_TAU = 300.0
+# Longer gaps between events are not integrated into the energy [s]
+MAX_GAP = 600.0
+
+
+class HeatRecovery:
+    """Streaming heat recovery efficiency, power and energy of a unit.
+
+    Every ui_info event updates exponential moving averages and integrates
+    the recovered power with the trapezoidal rule, so memory and work per
+    event are constant and history is never rescanned.
+    """
+
+    __slots__ = (
+        "supply_efficiency",
+        "exhaust_efficiency",
+        "recovered_power",
+        "recovered_energy",
+        "_last_time",
+        "_last_power",
+    )
+
+    def __init__(self, recovered_energy: float = 0.0) -> None:
+        self.supply_efficiency = None
+        self.exhaust_efficiency = None
+        self.recovered_power = None
+        # kWh
+        self.recovered_energy = recovered_energy
+        self._last_time = None
+        self._last_power = None
+
+    def update(self, temp_oda, temp_sup, temp_eta, temp_eha, flow_sup, now: float) -> dict:
+        """Take one set of readings, return the derived status values."""
+        dt = None if self._last_time is None else now - self._last_time
+        self._last_time = now
+        alpha = 1.0 if dt is None else 1.0 - math.exp(-max(dt, 0.0) / FILTER_TAU)
+
+        delta = temp_eta - temp_oda
+        if abs(delta) >= MIN_DELTA:
+            self.supply_efficiency = _smooth(
+                self.supply_efficiency, 100 * (temp_sup - temp_oda) / delta, alpha
+            )
+            self.exhaust_efficiency = _smooth(
+                self.exhaust_efficiency, 100 * (temp_eta - temp_eha) / delta, alpha
+            )
+
+        power = None
+        if flow_sup is not None:
+            power = AIR_HEAT_FLOW * flow_sup * (temp_sup - temp_oda)
+            self.recovered_power = _smooth(self.recovered_power, power, alpha)
+            if dt is not None and dt <= MAX_GAP and self._last_power is not None:
+                # only heat gained by the supply air counts as recovered
+                average = (max(power, 0.0) + max(self._last_power, 0.0)) / 2
+                self.recovered_energy += average * dt / 3600 / 1000
+        self._last_power = power
+
+        return {
+            'supply_efficiency': _round(self.supply_efficiency, 1),
+            'exhaust_efficiency': _round(self.exhaust_efficiency, 1),
+            'recovered_power': _round(self.recovered_power, 0),
+            'recovered_energy': round(self.recovered_energy, 3),
+        }
+
+
+def _smooth(previous, value, alpha):
+    if previous is None:
+        return value
+    return previous + alpha * (value - previous)
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
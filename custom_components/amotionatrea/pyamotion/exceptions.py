@@ -0,0 +1,24 @@
+""" Errors raised talking to the unit """
+
+
+class AtreaError(Exception):
+    """Base of the errors raised by the client."""
+
+
+class AtreaConnectionError(AtreaError):
+    """The unit cannot be reached, or the request cannot be queued."""
+
+
+class AtreaUnauthorized(AtreaError):
+    """The unit rejected our credentials or session token."""
+
+    def __init__(self, *args) -> None:
+        super().__init__(*(args or ("UNAUTHORIZED",)))
+
+
+class AtreaRequestError(AtreaError):
+    """The unit answered a request with an error code."""
+
+    def __init__(self, code, error=None) -> None:
+        super().__init__(f"{code}: {error}" if error else code)
+        self.code = code
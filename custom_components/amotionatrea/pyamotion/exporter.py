@@ -0,0 +1,276 @@
+""" OpenMetrics exposition of the status and link metrics of many units """
+
+import asyncio
+import logging
+
+from .metrics import LATENCY_BUCKETS
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+WORK_REGIMES = ("OFF", "AUTO", "VENTILATION")
+
+# Label values of the latency buckets, the last bucket takes everything else
+_BUCKET_BOUNDS = tuple(repr(bound) for bound in LATENCY_BUCKETS) + ("+Inf",)
+
+
+def _number(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _samples(name, fields):
+    """Samples of status `fields`, each with its extra labels."""
+
+    def render(labels, source):
+        lines = []
+        for extra, field in fields:
+            value = getattr(source, field)
+            if value is not None:
+                lines.append(f"{name}{{{labels}{extra}}} {_number(value)}\n")
+        return "".join(lines)
+
+    return render
+
+
+def _work_regime(labels, status):
+    if status.work_regime is None:
+        return ""
+    return "".join(
+        f'amotion_work_regime{{{labels},amotion_work_regime="{regime}"}} '
+        f'{1 if status.work_regime == regime else 0}\n'
+        for regime in WORK_REGIMES
+    )
+
+
+def _last_update(labels, status):
+    if status.last_update is None:
+        return ""
+    return f"amotion_last_update_timestamp_seconds{{{labels}}} {status.last_update.timestamp()}\n"
+
+
+def _up(labels, client):
+    return f"amotion_up{{{labels}}} {_number(client.logged_in)}\n"
+
+
+def _link_rtt(labels, client):
+    rtt = client.link_rtt
+    if rtt is None:
+        return ""
+    return f"amotion_link_rtt_seconds{{{labels}}} {rtt / 1000}\n"
+
+
+def _reconnects(labels, client):
+    return f"amotion_reconnects_total{{{labels}}} {client.reconnects}\n"
+
+
+def _timeouts(labels, client):
+    if client.metrics is None:
+        return ""
+    return f"amotion_request_timeouts_total{{{labels}}} {client.metrics.timeouts}\n"
+
+
+def _errors(labels, client):
+    if client.metrics is None:
+        return ""
+    return f"amotion_request_errors_total{{{labels}}} {client.metrics.errors}\n"
+
+
+def _latency(labels, client):
+    if client.metrics is None:
+        return ""
+    histogram = client.metrics.latency
+    name = "amotion_request_duration_seconds"
+    lines = []
+    cumulative = 0
+    for bound, count in zip(_BUCKET_BOUNDS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}\n')
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}\n")
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total!r}\n")
+    return "".join(lines)
+
+
+def _status_gauge(name, description, fields):
+    return (name, "gauge", description, frozenset(field for _, field in fields), _samples(name, fields))
+
+
+def _status_counter(name, description, fields):
+    return (name, "counter", description, frozenset(field for _, field in fields),
+            _samples(f"{name}_total", fields))
+
+
+# (name, type, help, status fields, render(labels, status)) of the families
+# read from the status snapshot, rendered again when one of their fields
+# changed, or every time without fields
+STATUS_FAMILIES = (
+    _status_gauge("amotion_temperature_celsius", "Air temperature measured by the unit", (
+        (',sensor="oda"', "temp_oda"),
+        (',sensor="ida"', "temp_ida"),
+        (',sensor="eta"', "temp_eta"),
+        (',sensor="eha"', "temp_eha"),
+        (',sensor="sup"', "temp_sup"),
+    )),
+    _status_gauge("amotion_setpoint_celsius", "Requested temperature", (("", "setpoint"),)),
+    _status_gauge("amotion_fan_factor_percent", "Fan speed", (
+        (',fan="eta"', "fan_eta_factor"),
+        (',fan="sup"', "fan_sup_factor"),
+    )),
+    _status_gauge("amotion_fan_request_percent", "Requested fan power", (("", "fan_mode"),)),
+    _status_gauge("amotion_bypass_percent", "Estimated bypass opening", (("", "bypass_estim"),)),
+    _status_gauge("amotion_preheater_percent", "Preheater power", (("", "preheater_factor"),)),
+    _status_gauge("amotion_motor_operating_hours", "Operating hours of the fan motors", (
+        (',motor="1"', "motor1_hours"),
+        (',motor="2"', "motor2_hours"),
+    )),
+    _status_gauge("amotion_uv_lamp_operating_hours", "Operating hours of the UV lamp",
+                  (("", "uv_lamp_hours"),)),
+    _status_gauge("amotion_heat_recovery_efficiency_percent", "Heat recovery efficiency", (
+        (',side="supply"', "supply_efficiency"),
+        (',side="exhaust"', "exhaust_efficiency"),
+    )),
+    _status_gauge("amotion_recovered_power_watts", "Heat recovered from the extract air",
+                  (("", "recovered_power"),)),
+    _status_counter("amotion_recovered_energy_kwh", "Heat recovered since counting started",
+                    (("", "recovered_energy"),)),
+    ("amotion_work_regime", "stateset", "Work regime of the unit",
+     frozenset(("work_regime",)), _work_regime),
+    ("amotion_last_update_timestamp_seconds", "gauge", "Time of the last live status",
+     None, _last_update),
+)
+
+# Families read from the client, rendered again when link_key() changes
+LINK_FAMILIES = (
+    ("amotion_up", "gauge", "Whether the client is logged in to the unit", None, _up),
+    ("amotion_link_rtt_seconds", "gauge", "Keepalive round trip time", None, _link_rtt),
+    ("amotion_reconnects", "counter", "Connections opened after the first one", None, _reconnects),
+    ("amotion_request_timeouts", "counter", "Requests without a reply in time", None, _timeouts),
+    ("amotion_request_errors", "counter", "Requests which failed otherwise", None, _errors),
+    ("amotion_request_duration_seconds", "histogram", "Time to the reply of a request",
+     None, _latency),
+)
+
+FAMILIES = STATUS_FAMILIES + LINK_FAMILIES
+
+
+def link_key(client) -> tuple:
+    """Cheap tuple which changes whenever a link family would render differently."""
+    metrics = client.metrics
+    return (
+        client.logged_in,
+        client.link_rtt,
+        client.reconnects,
+        None if metrics is None else metrics.replies,
+    )
+
+
+class _Unit:
+    __slots__ = ("client", "labels", "status", "link")
+
+    def __init__(self, client, name) -> None:
+        self.client = client
+        self.labels = f'unit="{_escape(name)}"'
+        # what the cached samples were rendered from
+        self.status = None
+        self.link = None
+
+
+class OpenMetricsExporter:
+    """Text exposition of many units, rendered incrementally.
+
+    The samples of every unit are cached per metric family. A scrape only
+    renders the status families of a unit again when their fields differ
+    from the snapshot they were rendered from, and its link families when
+    `link_key()` changed. Only the families whose samples changed are
+    joined and encoded again, the body is served as the list of family
+    blocks without joining them.
+    """
+
+    def __init__(self) -> None:
+        self._units = []
+        self._headers = tuple(
+            f"# TYPE {name} {kind}\n# HELP {name} {description}\n"
+            for name, kind, description, _, _ in FAMILIES
+        )
+        # family -> unit -> rendered samples
+        self._samples = [[] for _ in FAMILIES]
+        # encoded family blocks, the last one ends the exposition
+        self._blocks = [header.encode() for header in self._headers] + [b"# EOF\n"]
+        self._size = sum(map(len, self._blocks))
+
+    def __len__(self):
+        return len(self._units)
+
+    def add(self, client, name=None) -> None:
+        """Export `client` with the unit label `name`, its url by default."""
+        self._units.append(_Unit(client, name or client.url))
+        for samples in self._samples:
+            samples.append("")
+
+    def render(self) -> bytes:
+        return b"".join(self.render_blocks()[0])
+
+    def render_blocks(self) -> tuple[tuple[bytes, ...], int]:
+        """Blocks of the exposition and their total size in bytes."""
+        dirty = set()
+        link_start = len(STATUS_FAMILIES)
+        for index, unit in enumerate(self._units):
+            client = unit.client
+            status = client.status
+            if status is not unit.status:
+                changed = status.changed_since(unit.status)
+                unit.status = status
+                for family, (_, _, _, fields, render) in enumerate(STATUS_FAMILIES):
+                    if fields is None or not changed.isdisjoint(fields):
+                        self._update(family, index, render(unit.labels, status), dirty)
+            key = link_key(client)
+            if key != unit.link:
+                unit.link = key
+                for family, (_, _, _, _, render) in enumerate(LINK_FAMILIES, link_start):
+                    self._update(family, index, render(unit.labels, client), dirty)
+        for family in dirty:
+            block = (self._headers[family] + "".join(self._samples[family])).encode()
+            self._size += len(block) - len(self._blocks[family])
+            self._blocks[family] = block
+        return tuple(self._blocks), self._size
+
+    def _update(self, family, index, text, dirty):
+        if text != self._samples[family][index]:
+            self._samples[family][index] = text
+            dirty.add(family)
+
+    async def start_server(self, host="0.0.0.0", port=9120):
+        """Answer `GET /metrics` on `host`:`port`, returns the asyncio server."""
+        server = await asyncio.start_server(self._handle, host, port)
+        LOGGER.info("Serving metrics on %s:%s", host, port)
+        return server
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            # the headers of the request are of no interest
+            while (await reader.readline()).strip():
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, content_type = "200 OK", CONTENT_TYPE
+                blocks, size = self.render_blocks()
+            else:
+                status, content_type = "404 Not Found", "text/plain"
+                blocks, size = (b"Not Found\n",), 10
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {size}\r\nConnection: close\r\n\r\n".encode()
+            )
+            writer.writelines(blocks)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
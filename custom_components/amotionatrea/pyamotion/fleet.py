@@ -0,0 +1,110 @@
+""" Request budget and health of units polled together """
+
+import asyncio
+import contextlib
+import time
+
+from .const import FLEET_UNIT_MAX_REQUESTS
+
+
+class RequestBudget:
+    """Caps the requests in flight across all units of a fleet.
+
+    Used as `async with budget:` around a request, like a semaphore that
+    also counts what it let through. Units take their slots through
+    `share()`, which caps how many of them one unit may hold.
+    """
+
+    def __init__(self, limit: int, unit_limit: int = FLEET_UNIT_MAX_REQUESTS) -> None:
+        self.limit = limit
+        self.unit_limit = unit_limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.peak = 0
+        self.waited = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked():
+            self.waited += 1
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def share(self) -> "UnitShare":
+        """Slots of the budget one unit may hold."""
+        return UnitShare(self, self.unit_limit)
+
+    def as_dict(self) -> dict:
+        return {
+            "limit": self.limit,
+            "unit_limit": self.unit_limit,
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "waited": self.waited,
+        }
+
+
+class UnitShare:
+    """Caps the budget slots one unit holds at `limit`.
+
+    Polls may take all but one of them, the last one is left to control
+    writes so a unit whose polls stall can still be controlled.
+    """
+
+    def __init__(self, budget: RequestBudget, limit: int) -> None:
+        self._budget = budget
+        self._slots = asyncio.Semaphore(limit)
+        self._poll_slots = asyncio.Semaphore(max(limit - 1, 1))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, control: bool = False):
+        async with contextlib.AsyncExitStack() as stack:
+            if not control:
+                await stack.enter_async_context(self._poll_slots)
+            await stack.enter_async_context(self._slots)
+            await stack.enter_async_context(self._budget)
+            yield
+
+
+class UnitHealth:
+    """Refresh results of one unit."""
+
+    __slots__ = ("successes", "failures", "consecutive_failures", "last_error", "last_success")
+
+    def __init__(self) -> None:
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success = None
+
+    def record_success(self) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.last_success = time.monotonic()
+
+    def record_failure(self, err) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = repr(err)
+
+    def as_dict(self) -> dict:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "seconds_since_success": (
+                None if self.last_success is None
+                else round(time.monotonic() - self.last_success)
+            ),
+        }
+
+
+def stagger(index: int, count: int, interval: float) -> float:
+    """Start of the `index`-th of `count` jobs spread evenly over `interval`."""
+    return interval * index / max(count, 1)
@@ -0,0 +1,167 @@
+""" Per-endpoint request and inbound frame statistics """
+
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds of the latency buckets [s], 1 ms doubling up to about 33 s
+LATENCY_BUCKETS = tuple(0.001 * 2 ** exponent for exponent in range(16))
+
+
+class LatencyHistogram:
+    """Request latencies counted in fixed, exponentially growing buckets.
+
+    Observing is a bisect and an increment, percentiles are interpolated
+    within the bucket they fall into, so memory does not grow with the
+    number of requests.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        # the last bucket collects everything above the largest bound
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float) -> float | None:
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = LATENCY_BUCKETS[bucket - 1] if bucket else 0.0
+                upper = LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def as_dict(self) -> dict:
+        """Summary in milliseconds."""
+        return {
+            "count": self.count,
+            "mean": _ms(self.total / self.count) if self.count else None,
+            "p50": _ms(self.percentile(0.50)),
+            "p95": _ms(self.percentile(0.95)),
+            "p99": _ms(self.percentile(0.99)),
+            "max": _ms(self.max) if self.count else None,
+        }
+
+
+class EndpointStats:
+    __slots__ = ("requests", "timeouts", "errors", "latency")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "latency_ms": self.latency.as_dict(),
+        }
+
+
+class FrameStats:
+    __slots__ = ("frames", "bytes", "decode_time")
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+        self.decode_time = 0.0
+
+    def as_dict(self, uptime: float) -> dict:
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "frames_per_minute": round(60 * self.frames / uptime, 2) if uptime else None,
+            "mean_decode_us": (
+                round(1e6 * self.decode_time / self.frames, 1) if self.frames else None
+            ),
+        }
+
+
+class ProtocolMetrics:
+    """Counters of one unit connection.
+
+    Only created when metrics are enabled, callers check for None so a
+    disabled instance costs one comparison per request or frame.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.endpoints = defaultdict(EndpointStats)
+        self.frames = defaultdict(FrameStats)
+        self.latency = LatencyHistogram()
+        # requests accounted by finish(), whatever their outcome
+        self.replies = 0
+        # message id -> (endpoint, send time) of requests waiting for a reply
+        self._in_flight = {}
+
+    def start(self, message_id, endpoint: str) -> None:
+        self.endpoints[endpoint].requests += 1
+        self._in_flight[message_id] = (endpoint, time.perf_counter())
+
+    def finish(self, message_id, outcome: str) -> None:
+        """Account the reply to a request, `outcome` is ok, timeout or error."""
+        entry = self._in_flight.pop(message_id, None)
+        if entry is None:
+            return
+        endpoint, sent = entry
+        self.replies += 1
+        stats = self.endpoints[endpoint]
+        if outcome == "ok":
+            latency = time.perf_counter() - sent
+            stats.latency.observe(latency)
+            self.latency.observe(latency)
+        elif outcome == "timeout":
+            stats.timeouts += 1
+        else:
+            stats.errors += 1
+
+    def frame(self, kind: str, size: int, decode_time: float) -> None:
+        stats = self.frames[kind]
+        stats.frames += 1
+        stats.bytes += size
+        stats.decode_time += decode_time
+
+    @property
+    def timeouts(self) -> int:
+        return sum(stats.timeouts for stats in self.endpoints.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(stats.errors for stats in self.endpoints.values())
+
+    @property
+    def inbound_frames(self) -> int:
+        return sum(stats.frames for stats in self.frames.values())
+
+    def as_dict(self) -> dict:
+        uptime = time.monotonic() - self.started
+        return {
+            "uptime": round(uptime),
+            "in_flight": len(self._in_flight),
+            "latency_ms": self.latency.as_dict(),
+            "endpoints": {
+                endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()
+            },
+            "frames": {kind: stats.as_dict(uptime) for kind, stats in self.frames.items()},
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
@@ -0,0 +1,92 @@
+""" Bounded store of requests waiting for a reply from the unit """
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PendingRequests:
+    """Reply futures keyed by message id.
+
+    Ids come from one counter for the lifetime of the store, so a reply from
+    a previous connection can never be mistaken for the reply to a new
+    request. Slots older than `ttl` seconds and the oldest slots above
+    `max_size` are evicted, replies nobody waits for are dropped and counted.
+    """
+
+    def __init__(self, max_size=256, ttl=60.0) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._ids = itertools.count(1)
+        # insertion ordered, so the oldest slots are always first
+        self._futures = OrderedDict()
+        self.orphaned = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __contains__(self, message_id):
+        return message_id in self._futures
+
+    def create(self):
+        """Reserve a new message id and the future its reply resolves."""
+        now = time.monotonic()
+        self._evict(now)
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[message_id] = (now, future)
+        return message_id, future
+
+    def get(self, message_id):
+        entry = self._futures.get(message_id)
+        return entry[1] if entry else None
+
+    def discard(self, message_id):
+        self._futures.pop(message_id, None)
+
+    def resolve(self, message_id, response):
+        """Hand a reply to its waiter, returns False for orphaned replies."""
+        entry = self._futures.pop(message_id, None)
+        if entry is None or entry[1].done():
+            self.orphaned += 1
+            LOGGER.debug("Nobody is waiting for message %s", message_id)
+            return False
+        entry[1].set_result(response)
+        return True
+
+    def reject(self, message_id, err):
+        entry = self._futures.pop(message_id, None)
+        if entry is None:
+            self.orphaned += 1
+            return False
+        _fail(entry[1], err)
+        return True
+
+    def fail_all(self, err):
+        """Fail every outstanding request, e.g. when the connection dropped."""
+        futures, self._futures = self._futures, OrderedDict()
+        for _, future in futures.values():
+            _fail(future, err)
+
+    def _evict(self, now):
+        while self._futures:
+            message_id, (created, future) = next(iter(self._futures.items()))
+            if len(self._futures) < self._max_size and now - created < self._ttl:
+                break
+            del self._futures[message_id]
+            self.evicted += 1
+            _fail(future, asyncio.TimeoutError(f"Request {message_id} evicted"))
+
+
+def _fail(future, err):
+    if future.done():
+        return
+    future.set_exception(err)
+    # Mark the exception as retrieved, requests nobody awaits any more must
+    # not log "Future exception was never retrieved".
+    future.exception()
@@ -0,0 +1,119 @@
+""" Token bucket limiting the request rate sent to one unit """
+
+import asyncio
+import heapq
+import itertools
+import time
+
+# Weight of the newest reply in the latency average
+LATENCY_ALPHA = 0.2
+# Seconds between two rate decreases, the average needs time to react
+DECREASE_INTERVAL = 1.0
+
+
+class RateLimiter:
+    """Token bucket with an adaptive refill rate.
+
+    Up to `burst` requests go out at once, after that `rate` per second.
+    While the average reply latency stays above `latency_threshold` seconds
+    the refill rate is halved every second down to `rate / 8`, and it grows
+    back by a tenth of `rate` per fast reply once the unit recovered.
+    Waiting requests are served by priority, lower numbers first, and in
+    arrival order within a priority. A control write therefore only waits
+    for the next token, not behind the polls queued before it.
+    """
+
+    def __init__(self, rate: float, burst: int = 10, latency_threshold: float = 1.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.latency_threshold = latency_threshold
+        self.effective_rate = rate
+        self.latency = None
+        self.throttled = 0
+        self.backoffs = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._waiting = 0
+        # heap of [priority, arrival, future] of the waiting requests
+        self._waiters = []
+        self._arrival = itertools.count()
+        self._timer = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a token."""
+        return self._waiting
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.effective_rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = 0) -> None:
+        """Wait until the request may be sent, lower priorities go first."""
+        self._refill(time.monotonic())
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        self.throttled += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._arrival), future])
+        if self._timer is None:
+            self._schedule()
+        self._waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just before the cancel, give the token back
+                self._tokens += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+    def _schedule(self):
+        delay = max(0.0, (1 - self._tokens) / self.effective_rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        """Hand the tokens refilled meanwhile to the first waiters."""
+        self._timer = None
+        self._refill(time.monotonic())
+        while self._waiters and self._tokens >= 1:
+            future = heapq.heappop(self._waiters)[2]
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters:
+            self._schedule()
+
+    def observe(self, latency: float) -> None:
+        """Adapt the rate to the time the unit took to answer."""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_ALPHA * (latency - self.latency)
+        now = time.monotonic()
+        if self.latency > self.latency_threshold:
+            if now - self._last_decrease >= DECREASE_INTERVAL and self.effective_rate > self.rate / 8:
+                self._last_decrease = now
+                self.backoffs += 1
+                self._refill(now)
+                self.effective_rate = max(self.rate / 8, self.effective_rate / 2)
+        elif self.latency < self.latency_threshold / 2 and self.effective_rate < self.rate:
+            self._refill(now)
+            self.effective_rate = min(self.rate, self.effective_rate + self.rate / 10)
+
+    def as_dict(self) -> dict:
+        return {
+            "rate": self.rate,
+            "effective_rate": round(self.effective_rate, 3),
+            "burst": self.burst,
+            "queue_depth": self.queue_depth,
+            "throttled": self.throttled,
+            "backoffs": self.backoffs,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+        }
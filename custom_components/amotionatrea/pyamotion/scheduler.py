@@ -0,0 +1,106 @@
+""" Priority scheduling of the requests sharing the one websocket """
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+LOGGER = logging.getLogger(__name__)
+
+# Priority classes, lower numbers go first
+CONTROL = 0
+LIVE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = ("control", "live", "background")
+
+
+class RequestScheduler:
+    """Limits the requests in flight per priority class.
+
+    A request waits while its class has `limits[class]` requests in flight.
+    Live and background requests also wait while control requests are in
+    flight or queued, or while a control burst is open, so commands never
+    queue behind polling. Waiting requests are let through highest class
+    first, in arrival order within a class. A poll which is already waiting
+    is not queued a second time, the duplicate fails right away.
+    """
+
+    def __init__(self, limits=(2, 2, 2)) -> None:
+        self._limits = tuple(limits)
+        self._in_flight = [0] * len(self._limits)
+        # (future, key) of the requests waiting for a slot, per class
+        self._waiters = [deque() for _ in self._limits]
+        self._bursts = 0
+        self.deferred = 0
+        self.dropped = 0
+
+    @property
+    def in_flight(self) -> dict:
+        return dict(zip(PRIORITY_NAMES, self._in_flight))
+
+    @property
+    def waiting(self) -> dict:
+        return {name: len(waiters) for name, waiters in zip(PRIORITY_NAMES, self._waiters)}
+
+    def _control_busy(self):
+        return self._bursts or self._in_flight[CONTROL] or self._waiters[CONTROL]
+
+    def _allowed(self, priority):
+        if self._in_flight[priority] >= self._limits[priority]:
+            return False
+        return priority == CONTROL or not self._control_busy()
+
+    def _wake(self):
+        for priority, waiters in enumerate(self._waiters):
+            while waiters and self._allowed(priority):
+                future, _ = waiters.popleft()
+                if future.done():
+                    continue
+                self._in_flight[priority] += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority, key=None):
+        """Hold one in-flight slot of `priority` for the request.
+
+        `key` names a poll that may be dropped when the same poll is
+        already waiting, ConnectionError is raised then.
+        """
+        waiters = self._waiters[priority]
+        if not waiters and self._allowed(priority):
+            self._in_flight[priority] += 1
+        else:
+            if key is not None and any(waiting == key for _, waiting in waiters):
+                self.dropped += 1
+                raise ConnectionError(f"Dropped duplicate poll {key}")
+            future = asyncio.get_running_loop().create_future()
+            waiters.append((future, key))
+            self.deferred += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # the slot was granted just before we were cancelled
+                    self._release(priority)
+                elif (future, key) in waiters:
+                    waiters.remove((future, key))
+                raise
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def _release(self, priority):
+        self._in_flight[priority] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def burst(self):
+        """Hold back live and background requests, e.g. while control
+        variables are being collected."""
+        self._bursts += 1
+        try:
+            yield
+        finally:
+            self._bursts -= 1
+            self._wake()
@@ -0,0 +1,84 @@
+""" Immutable snapshot of the unit status """
+
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime
+
+
+@dataclass(frozen=True, slots=True)
+class AtreaStatus:
+    """Status of the unit, every update creates a new snapshot.
+
+    `changed` holds the names of the fields that differ from the previous
+    snapshot. Bookkeeping fields are left out of comparisons so two
+    snapshots are equal when the unit reports the same state.
+    """
+
+    state: str | None = None
+    current_temperature: float | None = None
+    setpoint: float | None = None
+    mode: str | None = None
+    # value of Home Assistant's HVACMode
+    current_hvac_mode: str = "auto"
+    fan_mode: float | None = None
+    temp_oda: float | None = None
+    temp_ida: float | None = None
+    temp_eha: float | None = None
+    fan_eta_factor: float | None = None
+    fan_sup_factor: float | None = None
+    temp_sup: float | None = None
+    temp_eta: float | None = None
+    season_current: str | None = None
+    work_regime: str | None = None
+    has_heater: bool = False
+    has_cooler: bool = False
+    filters_last_change: dict = field(default_factory=dict)
+    inspection_date: dict = field(default_factory=dict)
+    motor1_hours: int = 0
+    motor2_hours: int = 0
+    uv_lamp_hours: int | None = None
+    bypass_estim: int = 0
+    preheater_factor: int = 0
+    supply_efficiency: float | None = None
+    exhaust_efficiency: float | None = None
+    recovered_power: float | None = None
+    recovered_energy: float = 0.0
+
+    last_update: datetime | None = field(default=None, compare=False)
+    last_maintenance_update: datetime = field(default=datetime.min, compare=False)
+    changed: frozenset[str] = field(default=frozenset(), compare=False)
+
+    def update(self, **values) -> "AtreaStatus":
+        """Return a new snapshot with `values` applied."""
+        changed = frozenset(
+            name for name, value in values.items()
+            if name in STATUS_FIELDS and getattr(self, name) != value
+        )
+        return replace(self, changed=changed, **values)
+
+    def changed_since(self, other: "AtreaStatus | None") -> frozenset[str]:
+        """Names of the fields which differ from an older snapshot."""
+        if other is None:
+            return STATUS_FIELDS
+        return frozenset(
+            name for name in STATUS_FIELDS
+            if getattr(self, name) != getattr(other, name)
+        )
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def as_dict(self) -> dict:
+        """Plain values of the status fields, e.g. to store them."""
+        return {name: getattr(self, name) for name in STATUS_FIELDS}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "AtreaStatus":
+        """Snapshot from `as_dict()` output, unknown fields are ignored."""
+        return cls(**{
+            name: value for name, value in values.items() if name in STATUS_FIELDS
+        })
+
+
+STATUS_FIELDS = frozenset(
+    status_field.name for status_field in fields(AtreaStatus) if status_field.compare
+)
@@ -0,0 +1,177 @@
+""" Short term telemetry history kept in fixed size ring buffers """
+
+import math
+from array import array
+from bisect import bisect_left
+
+
+class RingBuffer:
+    """Fixed number of (timestamp, value) samples in flat arrays.
+
+    Appending is O(1) and never allocates, the oldest sample is overwritten
+    once the buffer is full. Timestamps must not decrease.
+    """
+
+    __slots__ = ("_times", "_values", "_size", "_head", "_count")
+
+    def __init__(self, size: int) -> None:
+        self._times = array("d", bytes(8 * size))
+        self._values = array("f", bytes(4 * size))
+        self._size = size
+        # next slot to write
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        """Whether older samples have started to be overwritten."""
+        return self._count == self._size
+
+    def append(self, timestamp: float, value: float) -> None:
+        self._times[self._head] = timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def _slot(self, position: int) -> int:
+        """Array slot of the n-th oldest sample."""
+        return (self._head - self._count + position) % self._size
+
+    def values(self, since: float | None = None) -> array:
+        """Values of the samples taken at or after `since`, oldest first."""
+        if not self._count:
+            return array("f")
+        start = 0
+        if since is not None:
+            # bisect over the logical (oldest first) order of the ring
+            start = bisect_left(
+                range(self._count), since, key=lambda pos: self._times[self._slot(pos)]
+            )
+        if start == self._count:
+            return array("f")
+        first = self._slot(start)
+        end = self._slot(self._count - 1) + 1
+        if first < end:
+            return self._values[first:end]
+        return self._values[first:] + self._values[:end]
+
+    def latest(self) -> tuple[float, float] | None:
+        if not self._count:
+            return None
+        slot = (self._head - 1) % self._size
+        return self._times[slot], self._values[slot]
+
+    def oldest_time(self) -> float | None:
+        return self._times[self._slot(0)] if self._count else None
+
+
+def _percentile(ordered, fraction):
+    """Linear interpolation between closest ranks of sorted values."""
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values) -> dict | None:
+    """min/max/mean/percentiles of a sample array."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": math.fsum(ordered) / len(ordered),
+        "p50": _percentile(ordered, 0.50),
+        "p95": _percentile(ordered, 0.95),
+    }
+
+
+class MetricHistory:
+    """Raw samples of one metric plus 1-minute and 15-minute averages.
+
+    Timestamps come from a monotonic clock, they must not decrease.
+    """
+
+    RESOLUTIONS = (60, 900)
+
+    __slots__ = ("raw", "downsampled", "_buckets")
+
+    def __init__(self, raw_size=360, minute_size=1440, quarter_size=672) -> None:
+        self.raw = RingBuffer(raw_size)
+        self.downsampled = {
+            60: RingBuffer(minute_size),
+            900: RingBuffer(quarter_size),
+        }
+        # resolution -> [bucket start, sum, count] of the bucket being filled
+        self._buckets = {resolution: [None, 0.0, 0] for resolution in self.RESOLUTIONS}
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.raw.append(timestamp, value)
+        for resolution, bucket in self._buckets.items():
+            start = timestamp - timestamp % resolution
+            if bucket[0] != start:
+                if bucket[2]:
+                    self.downsampled[resolution].append(bucket[0], bucket[1] / bucket[2])
+                bucket[0], bucket[1], bucket[2] = start, 0.0, 0
+            bucket[1] += value
+            bucket[2] += 1
+
+    def values(self, window: float, now: float) -> array:
+        """Samples of the last `window` seconds at the finest resolution
+        which still covers the whole window.
+
+        Averages include the bucket still being filled. When no resolution
+        covers the window the finest one which still holds every sample
+        recorded so far is used.
+        """
+        since = now - window
+        oldest = self.raw.oldest_time()
+        if oldest is None or oldest <= since or not self.raw.full:
+            return self.raw.values(since)
+        for resolution in self.RESOLUTIONS:
+            ring = self.downsampled[resolution]
+            oldest = ring.oldest_time()
+            if oldest is not None and oldest <= since or not ring.full:
+                return self._averages(resolution, since)
+        return self._averages(self.RESOLUTIONS[-1], since)
+
+    def _averages(self, resolution: int, since: float) -> array:
+        values = self.downsampled[resolution].values(since)
+        start, total, count = self._buckets[resolution]
+        if count and start + resolution > since:
+            values.append(total / count)
+        return values
+
+    def stats(self, window: float, now: float) -> dict | None:
+        return summarize(self.values(window, now))
+
+
+class TelemetryHistory:
+    """History of the tracked metrics of one unit."""
+
+    def __init__(self, metrics, **sizes) -> None:
+        self._metrics = {metric: MetricHistory(**sizes) for metric in metrics}
+
+    def __contains__(self, metric):
+        return metric in self._metrics
+
+    def record(self, values: dict, timestamp: float) -> None:
+        """Append the tracked metrics found in `values`."""
+        for metric, value in values.items():
+            history = self._metrics.get(metric)
+            if history is not None and value is not None:
+                history.append(timestamp, value)
+
+    def stats(self, metric: str, window: float, now: float) -> dict | None:
+        """Summary of a metric over the last `window` seconds before
+        `now`, a time.monotonic() reading like the recorded timestamps."""
+        return self._metrics[metric].stats(window, now)
+
+    def latest(self, metric: str):
+        return self._metrics[metric].raw.latest()
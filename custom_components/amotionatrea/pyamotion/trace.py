@@ -0,0 +1,87 @@
+""" Bounded trace of the last websocket frames for diagnostics """
+
+import json
+import time
+from collections import deque
+
+# Keys whose values never leave the trace
+REDACTED_KEYS = frozenset({"password", "username", "token", "production_number", "board_number"})
+# Replies to these endpoints carry secrets, e.g. the session token
+REDACTED_REPLIES = frozenset({"login"})
+REDACTED = "**REDACTED**"
+
+
+class TrafficTrace:
+    """The last `size` inbound and outbound frames.
+
+    Recording keeps a reference to the raw frame text and a few numbers,
+    decoding and redacting only happen when the trace is exported, so the
+    trace can stay on in production.
+    """
+
+    def __init__(self, size=200) -> None:
+        # (unix time, direction, kind, message id, bytes, latency [s], frame)
+        self._frames = deque(maxlen=size)
+        # message id -> (monotonic send time, endpoint) of unanswered requests
+        self._sent = {}
+        self._size = size
+
+    def __len__(self):
+        return len(self._frames)
+
+    def outbound(self, frame, message_id=None, endpoint=None) -> None:
+        if message_id is not None:
+            if len(self._sent) >= self._size:
+                # replies which never came, forget the oldest request
+                del self._sent[next(iter(self._sent))]
+            self._sent[message_id] = (time.monotonic(), endpoint)
+        self._frames.append((time.time(), "out", endpoint, message_id, len(frame), None, frame))
+
+    def inbound(self, frame, message) -> None:
+        """Record a received frame and its decoded message."""
+        message_id = kind = latency = None
+        if isinstance(message, dict):
+            message_id = message.get("id")
+            kind = message.get("event") or message.get("type")
+            sent = self._sent.pop(message_id, None) if message_id is not None else None
+            if sent is not None:
+                latency = time.monotonic() - sent[0]
+                kind = sent[1]
+        self._frames.append((time.time(), "in", kind, message_id, len(frame), latency, frame))
+
+    def export(self) -> list[dict]:
+        """Frames oldest first, decoded and with credentials redacted."""
+        return [
+            {
+                "time": timestamp,
+                "direction": direction,
+                "kind": kind,
+                "id": message_id,
+                "bytes": size,
+                "latency_ms": None if latency is None else round(latency * 1000, 2),
+                "message": _redact_frame(frame, direction == "in" and kind in REDACTED_REPLIES),
+            }
+            for timestamp, direction, kind, message_id, size, latency, frame in list(self._frames)
+        ]
+
+
+def _redact_frame(frame, reply_is_secret):
+    try:
+        message = json.loads(frame)
+    except ValueError:
+        return REDACTED
+    if reply_is_secret and isinstance(message, dict) and message.get("response") is not None:
+        message["response"] = REDACTED
+    return redact(message)
+
+
+def redact(value):
+    """Copy of a decoded message with the values of REDACTED_KEYS hidden."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in REDACTED_KEYS and item is not None else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
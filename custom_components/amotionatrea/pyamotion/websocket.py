@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import websockets
+
+from .codec import get_codec
+from .exceptions import AtreaConnectionError
+
+LOGGER = logging.getLogger(__name__)
+
+# Connections closed sooner than this many seconds count as failed attempts
+SHORT_CONNECTION = 10
+
+class AtreaWebsocket:
+    """Websocket connection to the unit.
+
+    All outgoing messages go through one writer task. Login messages are
+    written as soon as there is a connection, everything else waits in a
+    bounded queue until `set_ready()` is called after login, so messages
+    queued during a reconnect go out in order on the logged in socket.
+
+    A keepalive ping every `keepalive_interval` seconds measures the round
+    trip time and drops the connection when no pong comes back within
+    `keepalive_timeout`, reconnects back off exponentially with jitter.
+    """
+
+    def __init__(
+        self,
+        url,
+        queue_size=64,
+        codec=None,
+        keepalive_interval=20,
+        keepalive_timeout=10,
+        metrics=None,
+        trace=None,
+        recorder=None,
+    ):
+        self._url = url
+        self._codec = codec or get_codec()
+        self._websocket = None
+        self.reconnect_delay = 2
+        self.max_reconnect_delay = 60
+        self._keepalive_interval = keepalive_interval
+        self._keepalive_timeout = keepalive_timeout
+        self.rtt = None
+        self.connections = 0
+        self.dead_links = 0
+        self._last_message = None
+        self._queue_size = queue_size
+        self._queue = deque()
+        self._login_queue = deque()
+        # control messages, written before the other queued messages
+        self._urgent_queue = deque()
+        self._wakeup = asyncio.Event()
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.abandoned = 0
+        # ProtocolMetrics, None when metrics are disabled
+        self.metrics = metrics
+        # TrafficTrace of the last frames
+        self.trace = trace
+        # CaptureWriter while the session is recorded
+        self.recorder = recorder
+        # PendingRequests of the client, frames of requests nobody waits
+        # for any more, e.g. after a timeout, are not written
+        self.pending = None
+
+    @property
+    def reconnects(self):
+        return max(0, self.connections - 1)
+
+    @property
+    def last_message_age(self):
+        """Seconds since the last frame from the unit."""
+        if self._last_message is None:
+            return None
+        return time.monotonic() - self._last_message
+
+    @property
+    def queue_depth(self):
+        return len(self._queue) + len(self._login_queue) + len(self._urgent_queue)
+
+    def set_ready(self):
+        """The connection is logged in, start flushing queued messages."""
+        self._ready.set()
+        self._wakeup.set()
+
+    async def send(self, message, login=False, on_drop=None, urgent=False):
+        """Serialize a message and queue it for the writer task.
+
+        Messages with an `on_drop` callback are stale polls which may be
+        dropped to make room when the queue is full, the callback is then
+        called. When nothing can be dropped the send fails right away.
+        Urgent messages are written before any other queued message but
+        login.
+        """
+        # (frame, message id, endpoint) as written to the socket
+        frame = (self._codec.dumps(message), message.get('id'), message.get('endpoint'))
+        if login:
+            self._login_queue.append(frame)
+        elif urgent:
+            self._urgent_queue.append(frame)
+        else:
+            if len(self._queue) >= self._queue_size and not self._drop_stale():
+                raise AtreaConnectionError(f"Send queue to {self._url} is full")
+            self._queue.append((frame, on_drop))
+        self._wakeup.set()
+
+    def _drop_stale(self):
+        for item in self._queue:
+            if item[1] is not None:
+                self._queue.remove(item)
+                self.dropped += 1
+                LOGGER.debug("Dropped stale message %s", item[0][1])
+                item[1]()
+                return True
+        return False
+
+    async def _write_messages(self):
+        while True:
+            websocket = self._websocket
+            if websocket is not None and self._login_queue:
+                message, message_id, endpoint = self._login_queue.popleft()
+            elif websocket is not None and self._ready.is_set() and self._urgent_queue:
+                message, message_id, endpoint = self._urgent_queue.popleft()
+            elif websocket is not None and self._ready.is_set() and self._queue:
+                (message, message_id, endpoint), _ = self._queue.popleft()
+            else:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.pending is not None and message_id is not None and message_id not in self.pending:
+                # the caller gave up, a late control write would still
+                # change the unit after the UI rolled it back
+                LOGGER.debug("Not sending abandoned %s %s", endpoint, message_id)
+                self.abandoned += 1
+                continue
+            if self.trace is not None:
+                self.trace.outbound(message, message_id, endpoint)
+            if self.recorder is not None:
+                self.recorder.record("out", message, message_id, endpoint)
+            try:
+                await websocket.send(message)
+            except websockets.exceptions.ConnectionClosed:
+                # The request is failed with the connection, never resend it
+                # on the next socket.
+                LOGGER.debug("Connection closed, not sent %s %s", endpoint, message_id)
+
+    def _reset_queues(self):
+        """Drop what was queued for the closed connection."""
+        self._ready.clear()
+        self._login_queue.clear()
+        self._urgent_queue.clear()
+        for _, on_drop in self._queue:
+            if on_drop is not None:
+                on_drop()
+        self._queue.clear()
+
+    async def handle_messages(self, websocket, on_data):
+        try:
+            async for message in websocket:
+                self._last_message = time.monotonic()
+                metrics = self.metrics
+                if metrics is not None:
+                    start = time.perf_counter()
+                try:
+                    decoded_message = self._codec.loads(message)
+                except self._codec.errors as e:
+                    LOGGER.debug("Decoding error: %s", e)
+                    if metrics is not None:
+                        metrics.frame("undecodable", len(message), time.perf_counter() - start)
+                    if self.trace is not None:
+                        self.trace.inbound(message, None)
+                    if self.recorder is not None:
+                        self.recorder.record("in", message)
+                    continue
+                if metrics is not None:
+                    metrics.frame(
+                        _frame_kind(decoded_message), len(message), time.perf_counter() - start
+                    )
+                if self.trace is not None:
+                    self.trace.inbound(message, decoded_message)
+                if self.recorder is not None:
+                    self.recorder.record("in", message, _message_id(decoded_message))
+                try:
+                    await on_data(decoded_message)
+                except Exception:  # pylint: disable=broad-except
+                    # one frame of an unexpected shape must not end the connection
+                    LOGGER.exception("Error handling message from %s: %s", self._url, message)
+        except websockets.exceptions.ConnectionClosedError as e:
+            LOGGER.debug("Connection closed: %s", e)
+            raise e
+
+    async def _keepalive(self, websocket):
+        """Ping the unit, close the connection when it stops answering."""
+        while True:
+            await asyncio.sleep(self._keepalive_interval)
+            start = time.monotonic()
+            try:
+                pong = await websocket.ping()
+                async with asyncio.timeout(self._keepalive_timeout):
+                    await pong
+            except asyncio.TimeoutError:
+                LOGGER.warning(
+                    "No pong from %s within %ss, reconnecting", self._url, self._keepalive_timeout
+                )
+                self.dead_links += 1
+                # a closing handshake would only wait for the dead link again
+                websocket.transport.abort()
+                return
+            except websockets.exceptions.ConnectionClosed:
+                return
+            self.rtt = time.monotonic() - start
+
+    def _backoff(self, attempt):
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def connect(self, on_connect, on_data, on_close):
+        LOGGER.info("Connecting to %sapi/ws", self._url)
+        writer = asyncio.create_task(self._write_messages())
+        attempt = 0
+        try:
+            while True:
+                try:
+                    websocket = await websockets.connect(
+                        f"{self._url}api/ws",
+                        ping_interval=None,
+                        ping_timeout=None,
+                        close_timeout=self._keepalive_timeout,
+                        logger=LOGGER
+                    )
+                except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake) as err:
+                    delay = self._backoff(attempt)
+                    attempt += 1
+                    LOGGER.debug("Cannot connect to %s (%s), retrying in %.1fs", self._url, err, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                self.connections += 1
+                connected_at = self._last_message = time.monotonic()
+                keepalive = None
+                if self._keepalive_interval:
+                    keepalive = asyncio.create_task(self._keepalive(websocket))
+                try:
+                    self._websocket = websocket
+                    if on_connect:
+                        await on_connect()
+                    await self.handle_messages(websocket, on_data)
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+                finally:
+                    if keepalive:
+                        keepalive.cancel()
+                self._websocket = None
+                self._reset_queues()
+                if on_close:
+                    await on_close()
+                if time.monotonic() - connected_at > SHORT_CONNECTION:
+                    attempt = 0
+                    continue
+                # do not hammer a unit which keeps accepting and dropping
+                # connections, the first quick drop still reconnects at once
+                attempt += 1
+                if attempt > 1:
+                    delay = self._backoff(attempt - 2)
+                    LOGGER.debug("Connection to %s keeps dropping, retrying in %.1fs", self._url, delay)
+                    await asyncio.sleep(delay)
+        except Exception as err:
+            LOGGER.exception("Unexpected error: %s", err)
+            raise AtreaConnectionError(f"Connection to {self._url} failed") from err
+        finally:
+            writer.cancel()
+
+
+def _frame_kind(message):
+    """Event name of pushed events, message type of everything else."""
+    if not isinstance(message, dict):
+        return "unknown"
+    if message.get('type') == 'event':
+        return f"event:{message.get('event')}"
+    return message.get('type', 'unknown')
+
+
+def _message_id(message):
+    return message.get('id') if isinstance(message, dict) else None
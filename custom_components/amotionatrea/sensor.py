@@ -2,24 +2,29 @@
 
 import logging
 import json
+import time
 
 from collections.abc import Callable
 from dataclasses import dataclass
+from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
-    CONF_NAME,
+    EntityCategory,
+    UnitOfTime,
     UnitOfEnergy,
+    UnitOfPower,
     UnitOfTemperature,
     PERCENTAGE,
 )
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import async_generate_entity_id
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_call_later
 
-from . import AmotionAtreaCoordinator
+from . import AmotionAtrea, AmotionAtreaData, AtreaStatusCoordinator
+from .fleet import FleetManager
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from homeassistant.components.sensor import (
@@ -38,6 +43,95 @@ LOGGER = logging.getLogger(__name__)
 @dataclass(frozen=True)
 class AtreaSensorEntityDescription(SensorEntityDescription):
     json_value: str | None = None
+    # Reads values which are not part of the status, e.g. link diagnostics
+    value_fn: Callable[[AmotionAtrea], float | int | None] | None = None
+    # Only created for units where it returns True
+    exists_fn: Callable[[AmotionAtrea], bool] | None = None
+    # Refresh tier providing the value: live, diagram or maintenance
+    tier: str = "live"
+    # Changes smaller than max(deadband, deadband_relative * value) are held
+    deadband: float | None = None
+    deadband_relative: float | None = None
+    # Never publish more often than min_interval, publish held values
+    # averaged at least every max_interval
+    min_interval: timedelta | None = None
+    max_interval: timedelta | None = None
+
+    @property
+    def throttled(self) -> bool:
+        return bool(
+            self.deadband or self.deadband_relative or self.min_interval
+        )
+
+
+class SensorThrottle:
+    """Deadband and rate limit for a noisy numeric sensor.
+
+    Values within the deadband of the last published value, or arriving
+    sooner than min_interval after it, are held back. Held values are
+    averaged and the average is published after max_interval, so history
+    keeps following slow drifts inside the deadband.
+    """
+
+    def __init__(self, description: AtreaSensorEntityDescription) -> None:
+        self._deadband = description.deadband or 0.0
+        self._relative = description.deadband_relative or 0.0
+        self._min_interval = (
+            description.min_interval.total_seconds() if description.min_interval else 0.0
+        )
+        self._max_interval = (
+            description.max_interval.total_seconds() if description.max_interval else None
+        )
+        self.value = None
+        self._published_at = 0.0
+        self._latest = None
+        self._held_sum = 0.0
+        self._held_count = 0
+
+    def offer(self, value, now: float) -> bool:
+        """Take a new value, True when the published value changed."""
+        if self.value is None or not isinstance(value, (int, float)):
+            return self._publish(value, now)
+        self._latest = value
+        self._held_sum += value
+        self._held_count += 1
+        return self.flush(now)
+
+    def flush(self, now: float) -> bool:
+        """Publish held values which are due, True when something was."""
+        if not self._held_count:
+            return False
+        elapsed = now - self._published_at
+        if elapsed < self._min_interval:
+            return False
+        if self._outside_deadband(self._latest):
+            return self._publish(self._latest, now)
+        if self._max_interval is not None and elapsed >= self._max_interval:
+            return self._publish(round(self._held_sum / self._held_count, 2), now)
+        return False
+
+    def deadline(self) -> float | None:
+        """When the held values are due, None when nothing is held."""
+        if not self._held_count:
+            return None
+        if self._outside_deadband(self._latest):
+            return self._published_at + self._min_interval
+        if self._max_interval is None:
+            return None
+        return self._published_at + max(self._min_interval, self._max_interval)
+
+    def _outside_deadband(self, value) -> bool:
+        threshold = max(self._deadband, self._relative * abs(self.value))
+        return abs(value - self.value) > threshold
+
+    def _publish(self, value, now: float) -> bool:
+        self._held_sum = 0.0
+        self._held_count = 0
+        self._latest = None
+        self._published_at = now
+        published = value != self.value
+        self.value = value
+        return published
 
 
 ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
@@ -50,6 +144,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="temp_oda",
+        deadband=0.2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="inside_temperature",
@@ -60,6 +157,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="temp_ida",
+        deadband=0.2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="exhaust_temperature",
@@ -70,6 +170,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="temp_eha",
+        deadband=0.2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="fan_eta_factor",
@@ -78,6 +181,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.POWER_FACTOR,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="fan_eta_factor",
+        deadband=2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="supply_air_temperature",
@@ -88,6 +194,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="temp_sup",
+        deadband=0.2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="extract_temperature",
@@ -98,6 +207,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="temp_eta",
+        deadband=0.2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
     AtreaSensorEntityDescription(
         key="season_current",
@@ -115,6 +227,9 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.POWER_FACTOR,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="fan_sup_factor",
+        deadband=2,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
     ),
 
     # Additional sensors from ui_diagram_data
@@ -127,6 +242,7 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.POWER_FACTOR,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="bypass_estim",
+        tier="diagram",
     ),
     AtreaSensorEntityDescription(
         key="preheater_factor",
@@ -137,6 +253,145 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.POWER_FACTOR,
         state_class=SensorStateClass.MEASUREMENT,
         json_value="preheater_factor",
+        tier="diagram",
+    ),
+
+    # Derived from the temperatures and flows of each ui_info event
+    AtreaSensorEntityDescription(
+        key="supply_efficiency",
+        translation_key="supply_efficiency",
+        name="Supply Heat Recovery Efficiency",
+        icon="mdi:heat-wave",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        json_value="supply_efficiency",
+        deadband=1,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
+    ),
+    AtreaSensorEntityDescription(
+        key="exhaust_efficiency",
+        translation_key="exhaust_efficiency",
+        name="Exhaust Heat Recovery Efficiency",
+        icon="mdi:heat-wave",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        json_value="exhaust_efficiency",
+        deadband=1,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
+    ),
+    AtreaSensorEntityDescription(
+        key="recovered_power",
+        translation_key="recovered_power",
+        name="Recovered Heat Power",
+        icon="mdi:heat-wave",
+        native_unit_of_measurement=UnitOfPower.WATT,
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+        json_value="recovered_power",
+        exists_fn=lambda atrea: atrea.has_flow,
+        deadband_relative=0.05,
+        min_interval=timedelta(seconds=30),
+        max_interval=timedelta(minutes=10),
+    ),
+    AtreaSensorEntityDescription(
+        key="recovered_energy",
+        translation_key="recovered_energy",
+        name="Recovered Heat Energy",
+        icon="mdi:heat-wave",
+        native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        json_value="recovered_energy",
+        exists_fn=lambda atrea: atrea.has_flow,
+        min_interval=timedelta(minutes=1),
+    ),
+
+    # Connection diagnostics
+    AtreaSensorEntityDescription(
+        key="link_rtt",
+        translation_key="link_rtt",
+        name="Link Round Trip Time",
+        icon="mdi:lan-pending",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda atrea: atrea.link_rtt,
+    ),
+    AtreaSensorEntityDescription(
+        key="reconnects",
+        translation_key="reconnects",
+        name="Reconnects",
+        icon="mdi:lan-disconnect",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda atrea: atrea.reconnects,
+    ),
+    AtreaSensorEntityDescription(
+        key="last_message_age",
+        translation_key="last_message_age",
+        name="Time Since Last Message",
+        icon="mdi:timer-sand",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda atrea: atrea.last_message_age,
+    ),
+    AtreaSensorEntityDescription(
+        key="throttled_requests",
+        translation_key="throttled_requests",
+        name="Throttled Requests",
+        icon="mdi:speedometer-slow",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        exists_fn=lambda atrea: atrea.rate_limiter is not None,
+        value_fn=lambda atrea: atrea.rate_limiter.throttled,
+    ),
+    AtreaSensorEntityDescription(
+        key="request_queue_depth",
+        translation_key="request_queue_depth",
+        name="Request Queue Depth",
+        icon="mdi:tray-full",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda atrea: atrea.request_queue_depth,
+    ),
+    AtreaSensorEntityDescription(
+        key="request_latency_p95",
+        translation_key="request_latency_p95",
+        name="Request Latency 95th Percentile",
+        icon="mdi:timer-outline",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        exists_fn=lambda atrea: atrea.metrics is not None,
+        value_fn=lambda atrea: atrea.metrics.latency.as_dict()["p95"],
+    ),
+    AtreaSensorEntityDescription(
+        key="request_timeouts",
+        translation_key="request_timeouts",
+        name="Request Timeouts",
+        icon="mdi:timer-alert-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        exists_fn=lambda atrea: atrea.metrics is not None,
+        value_fn=lambda atrea: atrea.metrics.timeouts,
+    ),
+    AtreaSensorEntityDescription(
+        key="inbound_frames",
+        translation_key="inbound_frames",
+        name="Inbound Frames",
+        icon="mdi:download-network-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        exists_fn=lambda atrea: atrea.metrics is not None,
+        value_fn=lambda atrea: atrea.metrics.inbound_frames,
     ),
 
     # New sensors for maintenance data
@@ -146,6 +401,7 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         name="Filters Last Change",
         icon="mdi:filter",
         json_value="filters_last_change",
+        tier="maintenance",
     ),
     AtreaSensorEntityDescription(
         key="inspection_date",
@@ -153,6 +409,7 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         name="Inspection Date",
         icon="mdi:calendar-clock",
         json_value="inspection_date",
+        tier="maintenance",
     ),
     AtreaSensorEntityDescription(
         key="motor1_hours",
@@ -162,6 +419,7 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         native_unit_of_measurement="h",
         state_class=SensorStateClass.TOTAL,
         json_value="motor1_hours",
+        tier="maintenance",
     ),
     AtreaSensorEntityDescription(
         key="motor2_hours",
@@ -171,6 +429,7 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         native_unit_of_measurement="h",
         state_class=SensorStateClass.TOTAL,
         json_value="motor2_hours",
+        tier="maintenance",
     ),
     AtreaSensorEntityDescription(
         key="uv_lamp_hours",
@@ -180,6 +439,8 @@ ATREA_SENSORS: tuple[AtreaSensorEntityDescription, ...] = (
         native_unit_of_measurement="h",
         state_class=SensorStateClass.TOTAL,
         json_value="uv_lamp_hours",
+        tier="maintenance",
+        exists_fn=lambda atrea: atrea.has_uv_lamp,
     ),
 )
 
@@ -189,18 +450,48 @@ async def async_setup_entry(
     entry: ConfigEntry,
     async_add_entities: Callable,
 ):
-    sensor_name = entry.data.get(CONF_NAME)
-    coordinator: AmotionAtreaCoordinator = hass.data[DOMAIN][entry.entry_id]
+    fleet: FleetManager = hass.data[DOMAIN][entry.entry_id]
     entities: list[AAtreaDeviceSensor] = []
-    for description in ATREA_SENSORS:
-        if description.json_value == "uv_lamp_hours" and not coordinator.aatrea.has_uv_lamp:
-            continue
-        entities.append(AAtreaDeviceSensor(coordinator, description, sensor_name))
-    async_add_entities(entities, update_before_add=True)
+    for data in fleet:
+        for description in ATREA_SENSORS:
+            if description.exists_fn is None or description.exists_fn(data.aatrea):
+                entities.append(AAtreaDeviceSensor(data, description))
+            elif getattr(data, description.tier).data is None:
+                # Fleet units without a cache are set up before their first
+                # refresh, which tells whether the unit has e.g. a UV lamp
+                _async_add_when_known(entry, data, description, async_add_entities)
+    # the coordinators already hold the first refresh or the cached status
+    async_add_entities(entities)
+
+
+@callback
+def _async_add_when_known(entry, data, description, async_add_entities):
+    """Add the sensor after the first refresh of its tier, if it exists."""
+    coordinator = getattr(data, description.tier)
+    unsub = None
+
+    @callback
+    def async_stop():
+        nonlocal unsub
+        if unsub is not None:
+            unsub()
+            unsub = None
+
+    @callback
+    def async_check():
+        if coordinator.data is None:
+            # the refresh failed, wait for the next one
+            return
+        async_stop()
+        if description.exists_fn(data.aatrea):
+            async_add_entities([AAtreaDeviceSensor(data, description)])
+
+    unsub = coordinator.async_add_listener(async_check)
+    entry.async_on_unload(async_stop)
 
 
 class AAtreaDeviceSensor(
-    CoordinatorEntity[AmotionAtreaCoordinator], SensorEntity
+    CoordinatorEntity[AtreaStatusCoordinator], SensorEntity
 ):
 
     entity_description: AtreaSensorEntityDescription
@@ -208,29 +499,37 @@ class AAtreaDeviceSensor(
 
     def __init__(
         self,
-        coordinator,
+        data: AmotionAtreaData,
         description: AtreaSensorEntityDescription,
-        sensor_name
     ) -> None:
-        super().__init__(coordinator)
-        self._atrea = coordinator.aatrea
+        super().__init__(getattr(data, description.tier))
+        self._atrea = data.aatrea
         self.entity_description = description
         self._attr_name = description.name
-        self._attr_unique_id = "%s-%s" % (sensor_name, f"amotionatrea_{description.key}")
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self._atrea.name)},
-            manufacturer=self._atrea.brand,
-            model=self._atrea.model,
-            name=self._atrea.name,
-            sw_version=self._atrea.sw_version,
-            serial_number=self._atrea.serial,
-        )
+        self._attr_unique_id = "%s-%s" % (data.name, f"amotionatrea_{description.key}")
+        self._last_available = True
+        self._last_value = None
+        self._throttle = None
+        self._flush_at = None
+        self._unsub_flush = None
+        if description.throttled:
+            self._throttle = SensorThrottle(description)
+            self._throttle.offer(self._status_value(), time.monotonic())
+        self._attr_device_info = data.device_info
+
+    def _status_value(self):
+        if self.entity_description.value_fn is not None:
+            return self.entity_description.value_fn(self._atrea)
+        return self._atrea.status.get(self.entity_description.json_value)
 
     @property
     def native_value(self) -> float | str | None:
         """Return the state of the sensor."""
-        value = self._atrea.status.get(self.entity_description.json_value)
-        if not value:
+        if self._throttle is not None:
+            value = self._throttle.value
+        else:
+            value = self._status_value()
+        if value is None or value == {}:
             return None
 
         # Handle date formatting for filters_last_change and inspection_date
@@ -245,6 +544,52 @@ class AAtreaDeviceSensor(
         # Return numerical values as they are
         return value
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only when our published value changed."""
+        if self.entity_description.value_fn is not None:
+            value = self.native_value
+            changed = value != self._last_value
+            self._last_value = value
+        else:
+            changed = self.entity_description.json_value in self.coordinator.changed
+        if changed and self._throttle is not None:
+            changed = self._throttle.offer(self._status_value(), time.monotonic())
+            self._schedule_flush()
+        if changed or self.available != self._last_available:
+            self._last_available = self.available
+            self.async_write_ha_state()
+
+    @callback
+    def _schedule_flush(self) -> None:
+        """Make sure held values get published when they are due."""
+        deadline = self._throttle.deadline()
+        if deadline == self._flush_at:
+            return
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        self._flush_at = deadline
+        if deadline is not None:
+            self._unsub_flush = async_call_later(
+                self.hass, max(0.0, deadline - time.monotonic()), self._async_flush
+            )
+
+    @callback
+    def _async_flush(self, _now) -> None:
+        self._unsub_flush = None
+        self._flush_at = None
+        if self._throttle.flush(time.monotonic()):
+            self.async_write_ha_state()
+        self._schedule_flush()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Cancel the pending flush."""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        await super().async_will_remove_from_hass()
+
     async def async_update(self):
         """Fetch new state data for the sensor."""
         await self.coordinator.async_request_refresh()
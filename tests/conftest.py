@@ -0,0 +1,8 @@
+""" Unit tests of the standalone pyamotion client """
+
+import os
+import sys
+
+# The client package does not need Home Assistant, import it on its own
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                "custom_components", "amotionatrea"))
@@ -0,0 +1,34 @@
+""" Tests of the traffic capture """
+
+import json
+
+from pyamotion.capture import CaptureWriter, read_capture
+
+
+def test_capture_redacts_login(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    writer = CaptureWriter(path)
+    writer.record("out", json.dumps({"id": 1, "endpoint": "login", "args": {"password": "secret"}}),
+                  1, "login")
+    writer.record("in", json.dumps({"id": 1, "code": "OK", "response": "token"}), 1)
+    writer.close()
+    writer._thread.join()
+    frames = [frame for _, _, frame in read_capture(path)]
+    assert len(frames) == 2
+    assert "secret" not in frames[0]
+    assert "token" not in frames[1]
+
+
+def test_capture_stops_at_max_size(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    writer = CaptureWriter(path, max_size=1000)
+    for index in range(100):
+        writer.record("in", json.dumps({"type": "event", "index": index}))
+    writer.close()
+    writer._thread.join()
+    assert writer.full
+    assert path.stat().st_size <= 1000
+    frames = list(read_capture(path))
+    assert frames[0][2] == json.dumps({"type": "event", "index": 0})
+    writer.record("in", "{}")
+    assert writer._queue.empty()
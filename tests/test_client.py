@@ -0,0 +1,168 @@
+""" Tests of the replies the client gets from the unit """
+
+import asyncio
+
+import pytest
+
+from pyamotion import AtreaClient, AtreaRequestError, RequestBudget
+from pyamotion.websocket import AtreaWebsocket
+
+
+class UnitStub(AtreaWebsocket):
+    """Answers every request with the code and response set for its endpoint,
+    or returned by the function set for it."""
+
+    def __init__(self, replies) -> None:
+        super().__init__("stub://")
+        self.replies = replies
+        self.requests = []
+        self._on_data = None
+
+    async def send(self, message, login=False, on_drop=None, urgent=False):
+        self.requests.append(message)
+        code, response = self.replies.get(message["endpoint"], ("OK", None))
+        if callable(code):
+            code, response = code(message["args"])
+        reply = {"code": code, "error": None, "id": message["id"],
+                 "response": response, "type": "response"}
+        asyncio.get_running_loop().call_soon(
+            asyncio.ensure_future, self._on_data(reply)
+        )
+
+    async def connect(self, on_connect, on_data, on_close):
+        self._on_data = on_data
+        await asyncio.Event().wait()
+
+
+def client(replies, **kwargs):
+    kwargs.setdefault("rate_limit", 0)
+    return AtreaClient("stub://", "admin", "secret", keepalive_interval=0,
+                       transport=UnitStub(replies), **kwargs)
+
+
+def test_rejected_control_rolls_back():
+    async def run():
+        async with client({"control": ("INVALID_VALUE", None)}) as atrea:
+            await asyncio.sleep(0)
+            atrea.status = atrea.status.update(setpoint=20.0)
+            with pytest.raises(AtreaRequestError) as err:
+                await atrea.set_temperature(23)
+            assert err.value.code == "INVALID_VALUE"
+            assert atrea.status.setpoint == 20.0
+            assert not atrea.pending_fields
+
+    asyncio.run(run())
+
+
+def test_accepted_control_stays_pending():
+    async def run():
+        async with client({}) as atrea:
+            await asyncio.sleep(0)
+            atrea.status = atrea.status.update(setpoint=20.0)
+            await atrea.set_temperature(23)
+            assert atrea.status.setpoint == 23.0
+            assert atrea.pending_fields == {"setpoint"}
+
+    asyncio.run(run())
+
+
+def test_failed_poll_returns_none():
+    async def run():
+        async with client({"moments/get": ("NOT_FOUND", None)}) as atrea:
+            await asyncio.sleep(0)
+            assert await atrea.request("moments/get") is None
+            with pytest.raises(AtreaRequestError):
+                await atrea.request("moments/get", strict=True)
+
+    asyncio.run(run())
+
+
+def test_fetch_starts_as_soon_as_logged_in():
+    async def run():
+        ui_info = {"requests": {"fan_power_req": 40, "temp_request": 21.0, "work_regime": "AUTO"},
+                   "states": {"active": {}},
+                   "unit": {"fan_eta_factor": 40, "fan_sup_factor": 40, "mode_current": "NORMAL",
+                            "season_current": "HEATING", "temp_eha": 5.0, "temp_eta": 21.0,
+                            "temp_ida": 21.0, "temp_oda": 3.0, "temp_sup": 19.0}}
+        async with client({"ui_info": ("OK", ui_info)}) as atrea:
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, setattr, atrea, "logged_in", True)
+            start = loop.time()
+            status = await atrea.fetch()
+            assert loop.time() - start < 0.5
+            assert status.setpoint == 21.0
+
+    asyncio.run(run())
+
+
+SCHEME = ("OK", {"requests": {"fan_power_req": {}, "temp_request": {}}, "types": {}})
+
+
+def logins(atrea):
+    return [message["args"] for message in atrea._websocket.requests
+            if message["endpoint"] == "login"]
+
+
+def test_login_without_token_in_reply_fails():
+    async def run():
+        async with client({"login": ("OK", None), "ui_control_scheme": SCHEME}) as atrea:
+            await asyncio.sleep(0)
+            await atrea.login()
+            assert not atrea.logged_in
+            assert {"token": None} not in logins(atrea)
+
+    asyncio.run(run())
+
+
+def test_failed_token_login_falls_back_to_credentials():
+    def login(args):
+        if args.get("token") == "stale":
+            return "INTERNAL_ERROR", None
+        if "username" in args:
+            return "OK", "fresh"
+        return "OK", None
+
+    async def run():
+        async with client({"login": (login, None), "ui_control_scheme": SCHEME}) as atrea:
+            await asyncio.sleep(0)
+            atrea._token = "stale"
+            await atrea.login()
+            assert atrea.logged_in
+            assert logins(atrea) == [
+                {"token": "stale"},
+                {"username": "admin", "password": "secret"},
+                {"token": "fresh"},
+            ]
+
+    asyncio.run(run())
+
+
+def test_rejected_session_is_not_logged_in():
+    def login(args):
+        if "username" in args:
+            return "OK", "fresh"
+        return "UNAUTHORIZED", None
+
+    async def run():
+        async with client({"login": (login, None), "ui_control_scheme": SCHEME}) as atrea:
+            await asyncio.sleep(0)
+            await atrea.login()
+            assert not atrea.logged_in
+
+    asyncio.run(run())
+
+
+def test_throttled_unit_holds_no_fleet_slot():
+    async def run():
+        budget = RequestBudget(4)
+        async with client({}, rate_limit=1, shared_limit=budget) as atrea:
+            await asyncio.sleep(0)
+            atrea.logged_in = True
+            atrea.rate_limiter._tokens = 0
+            poll = asyncio.create_task(atrea.request("ui_info"))
+            await asyncio.sleep(0.05)
+            assert atrea.rate_limiter.queue_depth == 1
+            assert budget.in_flight == 0
+            poll.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+""" Tests of the control write coalescing """
+
+import asyncio
+
+import pytest
+
+from pyamotion.control import ControlCoalescer
+from pyamotion.exceptions import AtreaConnectionError
+
+
+class Unit:
+    """Records the control writes, each taking `latency` seconds."""
+
+    def __init__(self, latency=0.0, error=None) -> None:
+        self.latency = latency
+        self.error = error
+        self.writes = []
+
+    async def send(self, variables):
+        self.writes.append(variables)
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return "OK"
+
+
+def coalescer(unit, delay=0.05, max_delay=0.2):
+    return ControlCoalescer(unit.send, asyncio.create_task, delay, max_delay)
+
+
+def test_first_write_goes_out_at_once():
+    async def run():
+        unit = Unit()
+        control = coalescer(unit, delay=10)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        assert await control.submit({"temp_request": 21}) == "OK"
+        assert loop.time() - start < 1
+        assert unit.writes == [{"temp_request": 21}]
+
+    asyncio.run(run())
+
+
+def test_following_writes_are_coalesced():
+    async def run():
+        unit = Unit()
+        control = coalescer(unit)
+        results = await asyncio.gather(
+            control.submit({"temp_request": 21}),
+            control.submit({"fan_power_req": 40}),
+            control.submit({"temp_request": 22}),
+        )
+        assert results == ["OK", "OK", "OK"]
+        assert unit.writes == [
+            {"temp_request": 21},
+            {"fan_power_req": 40, "temp_request": 22},
+        ]
+        assert control.writes == 2
+        assert control.coalesced == 1
+
+    asyncio.run(run())
+
+
+def test_write_after_quiet_period_goes_out_at_once():
+    async def run():
+        unit = Unit()
+        control = coalescer(unit, delay=0.01)
+        await control.submit({"temp_request": 21})
+        await asyncio.sleep(0.05)
+        await control.submit({"temp_request": 22})
+        assert unit.writes == [{"temp_request": 21}, {"temp_request": 22}]
+
+    asyncio.run(run())
+
+
+def test_failed_write_fails_every_caller():
+    async def run():
+        unit = Unit(error=AtreaConnectionError("rejected"))
+        control = coalescer(unit)
+        results = await asyncio.gather(
+            control.submit({"temp_request": 21}),
+            control.submit({"fan_power_req": 40}),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, AtreaConnectionError) for result in results)
+
+    asyncio.run(run())
+
+
+def test_cancelled_write_settles_the_callers():
+    async def run():
+        unit = Unit(latency=10)
+        tasks = set()
+
+        def create_task(coro):
+            task = asyncio.create_task(coro)
+            tasks.add(task)
+            return task
+
+        control = ControlCoalescer(unit.send, create_task, 0.05, 0.2)
+        caller = asyncio.create_task(control.submit({"temp_request": 21}))
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        with pytest.raises(AtreaConnectionError):
+            await asyncio.wait_for(caller, 1)
+
+    asyncio.run(run())
+
+
+def test_cancel_fails_the_collected_burst():
+    async def run():
+        unit = Unit()
+        control = coalescer(unit, delay=10, max_delay=10)
+        await control.submit({"temp_request": 21})
+        caller = asyncio.create_task(control.submit({"temp_request": 22}))
+        await asyncio.sleep(0)
+        assert control.pending == {"temp_request": 22}
+        control.cancel()
+        with pytest.raises(AtreaConnectionError):
+            await asyncio.wait_for(caller, 1)
+        assert unit.writes == [{"temp_request": 21}]
+
+    asyncio.run(run())
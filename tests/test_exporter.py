@@ -0,0 +1,41 @@
+""" Tests of the OpenMetrics exposition """
+
+from types import SimpleNamespace
+
+from pyamotion import AtreaStatus, OpenMetricsExporter
+
+
+def unit(**status):
+    return SimpleNamespace(
+        status=AtreaStatus().update(**status),
+        url="ws://unit/",
+        logged_in=True,
+        link_rtt=None,
+        reconnects=0,
+        metrics=None,
+    )
+
+
+def lines(exporter):
+    return exporter.render().decode().splitlines()
+
+
+def test_recovered_energy_is_a_counter():
+    exporter = OpenMetricsExporter()
+    exporter.add(unit(recovered_energy=12.5))
+    text = lines(exporter)
+    assert "# TYPE amotion_recovered_energy_kwh counter" in text
+    assert 'amotion_recovered_energy_kwh_total{unit="ws://unit/"} 12.5' in text
+    assert text[-1] == "# EOF"
+
+
+def test_only_changed_samples_are_rendered_again():
+    client = unit(temp_oda=3.0, setpoint=21.0)
+    exporter = OpenMetricsExporter()
+    exporter.add(client, "hall")
+    assert 'amotion_temperature_celsius{unit="hall",sensor="oda"} 3.0' in lines(exporter)
+    client.status = client.status.update(temp_oda=4.0)
+    text = lines(exporter)
+    assert 'amotion_temperature_celsius{unit="hall",sensor="oda"} 4.0' in text
+    assert 'amotion_setpoint_celsius{unit="hall"} 21.0' in text
+    assert 'amotion_up{unit="hall"} 1' in text
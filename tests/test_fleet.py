@@ -0,0 +1,34 @@
+""" Tests of the request budget shared by a fleet """
+
+import asyncio
+
+from pyamotion.fleet import RequestBudget
+
+
+async def hold(share, held, control=False):
+    async with share.slot(control):
+        held.append(control)
+        await asyncio.Event().wait()
+
+
+def test_one_unit_cannot_take_the_whole_budget():
+    async def run():
+        budget = RequestBudget(8, unit_limit=3)
+        stalled, healthy = budget.share(), budget.share()
+        held = []
+        tasks = [asyncio.create_task(hold(stalled, held)) for _ in range(6)]
+        await asyncio.sleep(0)
+        # polls leave the last slot of the unit to control writes
+        assert budget.in_flight == 2
+        tasks.append(asyncio.create_task(hold(stalled, held, control=True)))
+        tasks.append(asyncio.create_task(hold(stalled, held, control=True)))
+        tasks.append(asyncio.create_task(hold(healthy, held)))
+        await asyncio.sleep(0)
+        assert budget.in_flight == 4
+        assert held.count(True) == 1
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert budget.in_flight == 0
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+""" Tests of the per-unit request rate limit """
+
+import asyncio
+
+import pytest
+
+from pyamotion.ratelimit import RateLimiter
+from pyamotion.scheduler import BACKGROUND, CONTROL
+
+
+def test_burst_goes_out_at_once_then_rate_applies():
+    async def run():
+        limiter = RateLimiter(20, burst=3)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await limiter.acquire()
+        assert loop.time() - start < 0.02
+        assert limiter.throttled == 0
+        await limiter.acquire()
+        assert loop.time() - start >= 0.04
+        assert limiter.throttled == 1
+
+    asyncio.run(run())
+
+
+def test_control_is_served_before_queued_polls():
+    async def run():
+        limiter = RateLimiter(20, burst=1)
+        await limiter.acquire()
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        polls = [asyncio.create_task(request(f"poll{i}", BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        control = asyncio.create_task(request("control", CONTROL))
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 4
+        await asyncio.gather(control, *polls)
+        assert order == ["control", "poll0", "poll1", "poll2"]
+        assert limiter.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_take_a_token():
+    async def run():
+        limiter = RateLimiter(20, burst=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        assert loop.time() - start < 0.1
+        assert limiter.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_slow_replies_halve_the_rate_down_to_an_eighth():
+    limiter = RateLimiter(8, latency_threshold=1.0)
+    limiter.observe(2.0)
+    assert limiter.effective_rate == 4
+    # the average needs time to react, no second decrease at once
+    limiter.observe(2.0)
+    assert limiter.effective_rate == 4
+    for _ in range(5):
+        limiter._last_decrease -= 1
+        limiter.observe(2.0)
+    assert limiter.effective_rate == 1
+    assert limiter.backoffs == 3
+
+
+def test_fast_replies_restore_the_rate():
+    limiter = RateLimiter(10, latency_threshold=1.0)
+    limiter.observe(2.0)
+    assert limiter.effective_rate == 5
+    for _ in range(30):
+        limiter.observe(0.0)
+    assert limiter.latency < 0.5
+    assert limiter.effective_rate == 10
+    assert limiter.as_dict()["effective_rate"] == 10
@@ -0,0 +1,77 @@
+""" Tests of the request priority scheduling """
+
+import asyncio
+
+import pytest
+
+from pyamotion.const import REQUEST_LIMITS
+from pyamotion.scheduler import BACKGROUND, CONTROL, LIVE, RequestScheduler
+
+
+async def hold(scheduler, priority, log, name, release, key=None):
+    async with scheduler.slot(priority, key):
+        log.append(name)
+        await release.wait()
+
+
+def test_background_requests_are_pipelined():
+    async def run():
+        scheduler = RequestScheduler(REQUEST_LIMITS)
+        log = []
+        release = asyncio.Event()
+        tasks = [
+            asyncio.create_task(hold(scheduler, BACKGROUND, log, name, release))
+            for name in ("discovery", "version")
+        ]
+        await asyncio.sleep(0)
+        assert log == ["discovery", "version"]
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_control_goes_first():
+    async def run():
+        scheduler = RequestScheduler((1, 1, 1))
+        log = []
+        first = asyncio.Event()
+        rest = asyncio.Event()
+        busy = [
+            asyncio.create_task(hold(scheduler, priority, log, name, first))
+            for priority, name in ((LIVE, "busy live"), (BACKGROUND, "busy background"))
+        ]
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(hold(scheduler, priority, log, name, rest))
+            for priority, name in ((BACKGROUND, "background"), (LIVE, "live"), (CONTROL, "control"))
+        ]
+        await asyncio.sleep(0)
+        # control does not wait for the requests in flight
+        assert log[2:] == ["control"]
+        rest.set()
+        await asyncio.sleep(0)
+        first.set()
+        await asyncio.gather(*busy, *tasks)
+        # then the waiting live request goes before the background one
+        assert log[3:] == ["live", "background"]
+
+    asyncio.run(run())
+
+
+def test_duplicate_poll_is_dropped():
+    async def run():
+        scheduler = RequestScheduler((1, 1, 1))
+        log = []
+        release = asyncio.Event()
+        busy = asyncio.create_task(hold(scheduler, LIVE, log, "busy", release))
+        waiting = asyncio.create_task(hold(scheduler, LIVE, log, "poll", release, "ui_info"))
+        await asyncio.sleep(0)
+        with pytest.raises(ConnectionError):
+            await hold(scheduler, LIVE, log, "again", release, "ui_info")
+        assert scheduler.dropped == 1
+        release.set()
+        await asyncio.gather(busy, waiting)
+        assert log == ["busy", "poll"]
+
+    asyncio.run(run())
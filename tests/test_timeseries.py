@@ -0,0 +1,73 @@
+""" Tests of the telemetry history """
+
+from pyamotion.timeseries import MetricHistory, RingBuffer, TelemetryHistory, summarize
+
+
+def test_ring_buffer_overwrites_oldest():
+    ring = RingBuffer(4)
+    for second in range(6):
+        ring.append(second, second * 10)
+    assert len(ring) == 4
+    assert ring.full
+    assert ring.oldest_time() == 2
+    assert ring.latest() == (5, 50)
+    assert list(ring.values()) == [20, 30, 40, 50]
+    assert list(ring.values(since=4)) == [40, 50]
+    assert list(ring.values(since=6)) == []
+
+
+def test_summarize():
+    stats = summarize([4, 1, 3, 2])
+    assert stats["count"] == 4
+    assert stats["min"] == 1
+    assert stats["max"] == 4
+    assert stats["mean"] == 2.5
+    assert stats["p50"] == 2.5
+    assert summarize([]) is None
+
+
+def test_window_longer_than_history_uses_raw_samples():
+    history = MetricHistory()
+    # 20 minutes of samples every 5 seconds
+    for sample in range(240):
+        history.append(1000 + sample * 5, sample)
+    now = 1000 + 239 * 5
+    values = history.values(3600, now)
+    assert len(values) == 240
+    assert max(values) == 239
+    assert history.stats(3600, now)["max"] == 239
+
+
+def test_window_within_raw_samples():
+    history = MetricHistory(raw_size=10)
+    for sample in range(30):
+        history.append(sample, sample)
+    assert list(history.values(4, 29)) == [25, 26, 27, 28, 29]
+
+
+def test_averages_include_bucket_in_progress():
+    history = MetricHistory(raw_size=10)
+    # two full minutes of 0 and 1, then half a minute of 2
+    for second in range(150):
+        history.append(second, second // 60)
+    values = history.values(150, 149)
+    assert list(values) == [0, 1, 2]
+
+
+def test_averages_when_raw_samples_were_overwritten():
+    history = MetricHistory(raw_size=10, minute_size=3)
+    for second in range(600):
+        history.append(second, second // 60)
+    # the minute ring holds minutes 6..8, minute 9 is still in progress
+    assert list(history.values(200, 599)) == [7, 8, 9]
+    # only the quarter being filled still holds every sample
+    assert list(history.values(3600, 599)) == [4.5]
+
+
+def test_telemetry_history_ignores_untracked_and_missing():
+    history = TelemetryHistory(("temp_oda",), raw_size=10)
+    history.record({"temp_oda": 1.5, "temp_ida": 20, "other": None}, 1)
+    history.record({"temp_oda": None}, 2)
+    assert "temp_oda" in history
+    assert "temp_ida" not in history
+    assert history.latest("temp_oda") == (1, 1.5)
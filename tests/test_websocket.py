@@ -0,0 +1,94 @@
+""" Tests of the send queue and the pending requests """
+
+import asyncio
+
+import pytest
+
+from pyamotion.exceptions import AtreaConnectionError
+from pyamotion.pending import PendingRequests
+from pyamotion.websocket import AtreaWebsocket
+
+
+class Socket:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+
+async def queued(transport, pending, endpoint, urgent=False):
+    message_id, _ = pending.create()
+    await transport.send({"endpoint": endpoint, "args": None, "id": message_id}, urgent=urgent)
+    return message_id
+
+
+def test_abandoned_requests_are_not_written():
+    async def run():
+        pending = PendingRequests()
+        transport = AtreaWebsocket("ws://unit/")
+        transport.pending = pending
+        # queued while the unit is unreachable
+        control = await queued(transport, pending, "control", urgent=True)
+        poll = await queued(transport, pending, "ui_info")
+        # the control write timed out, its caller rolled the UI back
+        pending.discard(control)
+
+        socket = Socket()
+        transport._websocket = socket
+        transport.set_ready()
+        writer = asyncio.create_task(transport._write_messages())
+        await asyncio.sleep(0.01)
+        writer.cancel()
+        assert len(socket.sent) == 1
+        assert f'"id":{poll}' in socket.sent[0].replace(" ", "")
+        assert transport.abandoned == 1
+
+    asyncio.run(run())
+
+
+def test_full_queue_drops_stale_polls():
+    async def run():
+        transport = AtreaWebsocket("ws://unit/", queue_size=2)
+        dropped = []
+        await transport.send({"endpoint": "ui_info", "id": 1}, on_drop=lambda: dropped.append(1))
+        await transport.send({"endpoint": "version", "id": 2})
+        await transport.send({"endpoint": "discovery", "id": 3})
+        assert dropped == [1]
+        with pytest.raises(AtreaConnectionError):
+            await transport.send({"endpoint": "version", "id": 4})
+
+    asyncio.run(run())
+
+
+def test_pending_requests_resolve_and_reject():
+    async def run():
+        pending = PendingRequests()
+        first, future = pending.create()
+        second, other = pending.create()
+        assert second > first
+        assert pending.resolve(first, "reply")
+        assert await future == "reply"
+        assert pending.reject(second, ValueError("rejected"))
+        with pytest.raises(ValueError):
+            await other
+        # late replies nobody waits for are counted
+        assert not pending.resolve(first, "again")
+        assert pending.orphaned == 1
+        assert len(pending) == 0
+
+    asyncio.run(run())
+
+
+def test_pending_requests_evict_oldest():
+    async def run():
+        pending = PendingRequests(max_size=2)
+        first, future = pending.create()
+        pending.create()
+        pending.create()
+        assert first not in pending
+        assert pending.evicted == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await future
+
+    asyncio.run(run())